@@ -0,0 +1,335 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Dict, List
+from config.constants import (MATCH_ARCHIVE_DIR, MATCH_HISTORY_ENCODING, MATCH_HISTORY_FILE,
+                              MATCH_QUARANTINE_FILE, SETUP_COUNTS_CACHE_DIR)
+from models.player import Player
+from scripts import compiled_scripts
+from services.fuzzy_index import FuzzyIndex
+from services.history_transfer import HistoryTransfer
+from services.match_storage import MatchStorage
+from services.setup_enumeration import SetupEnumeration
+from services.setup_simulation import SetupSimulation
+from services.storage import get_match_storage
+
+def _duplicates(args) -> int:
+    """Print pairs of usernames that are probably the same player"""
+    usernames = get_match_storage().get_all_usernames()
+    index = FuzzyIndex(usernames, max_distance=args.distance)
+    pairs = index.find_likely_duplicates(min_length=args.min_length)
+    for first, second, distance in pairs:
+        print(f"{first}\t{second}\t{distance}")
+    print(f"{len(pairs)} likely duplicate pair(s) among {len(usernames)} usernames")
+    return 0
+
+def _convert(args) -> int:
+    """Rewrite the CSV history in the current file format"""
+    games = MatchStorage.convert_history()
+    print(f"Wrote {games} game(s) to {MATCH_HISTORY_FILE} "
+          f"in format version {MatchStorage.FORMAT_VERSION}")
+    return 0
+
+def _compact(args) -> int:
+    """Remove duplicate games and malformed lines from the CSV history"""
+    counts = MatchStorage.compact_history()
+    print(f"Wrote {counts['games']} game(s) to {MATCH_HISTORY_FILE}, "
+          f"removed {counts['duplicates']} duplicate save(s)")
+    if counts["quarantined"]:
+        print(f"Moved {counts['quarantined']} malformed line(s) to {MATCH_QUARANTINE_FILE}")
+    return 0
+
+def _archive(args) -> int:
+    """Move the oldest games into compressed archive segments"""
+    games = MatchStorage.archive_history(args.keep, args.segment_games)
+    print(f"Archived {games} game(s) from {MATCH_HISTORY_FILE} into {MATCH_ARCHIVE_DIR}")
+    return 0
+
+def _date(value: str) -> int:
+    """Parse a YYYY-MM-DD command-line date as the Unix time it starts, locally"""
+    try:
+        return int(time.mktime(time.strptime(value, "%Y-%m-%d")))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a YYYY-MM-DD date: {value}")
+
+def _export(args) -> int:
+    """Write the games passing the filters to a CSV or JSON Lines file"""
+    file_format = args.format or ("jsonl" if args.path.endswith((".jsonl", ".json")) else "csv")
+    # --until is the whole day
+    until = args.until + 24 * 60 * 60 - 1 if args.until is not None else None
+    with open(args.path, "w", newline="", encoding=MATCH_HISTORY_ENCODING) as f:
+        games = HistoryTransfer.export_games(
+            get_match_storage(), f, file_format, script=args.script,
+            storyteller=args.storyteller, since=args.since, until=until
+        )
+    print(f"Exported {games} game(s) to {args.path} as {file_format}")
+    return 0
+
+def _import(args) -> int:
+    """Add the games from other histories that aren't already in this one"""
+    rejected = []
+    games = (rows for path in args.paths 
+             for rows in HistoryTransfer.iter_file_games(path, rejected))
+    counts = HistoryTransfer.import_games(get_match_storage(), games)
+    print(f"Imported {counts['added']} game(s), "
+          f"skipped {counts['duplicates']} already in the history")
+    if counts["renumbered"]:
+        print(f"Gave {counts['renumbered']} imported game(s) a new ID, "
+              f"as theirs was already taken")
+    if rejected:
+        print(f"Skipped {len(rejected)} malformed line(s)")
+    return 0
+
+def _residents(value: str) -> range:
+    """Parse a resident count or MIN-MAX range"""
+    low, _, high = value.partition("-")
+    try:
+        return range(int(low), int(high or low) + 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a count or MIN-MAX range: {value}")
+
+def _simulate(args) -> int:
+    """Generate many setups per script and player count and summarise them"""
+    names = args.script or list(compiled_scripts)
+    unknown = [name for name in names if name not in compiled_scripts]
+    if unknown:
+        print(f"Unknown script(s): {', '.join(unknown)}")
+        return 2
+    
+    start = time.perf_counter()
+    results = SetupSimulation.run(
+        {name: compiled_scripts[name] for name in names}, args.residents, 
+        args.travelers, args.setups, args.seed, args.workers
+    )
+    elapsed = time.perf_counter() - start
+    
+    for (name, residents, travelers), histogram in results.items():
+        for message, count in histogram.errors.items():
+            print(f"{name}, {residents}+{travelers} players: {count} failed: {message}")
+    for name, histogram in SetupSimulation.by_script(results).items():
+        script = compiled_scripts[name]
+        never = [role for role_type in ("Townsfolk", "Outsider", "Minion", "Demon")
+                 for role in script[role_type] if role not in histogram.role_counts]
+        outsiders = ", ".join(f"{count}: {setups / max(1, histogram.setups):.1%}"
+                              for count, setups in sorted(histogram.outsider_counts.items()))
+        rate = histogram.marionette_adjacency_rate()
+        print(f"{name}: {histogram.setups} setups")
+        print(f"  outsiders in play: {outsiders}")
+        if rate is not None:
+            print(f"  Marionette next to the Demon: {rate:.1%} "
+                  f"of {histogram.marionette_setups} setups")
+        if never:
+            print(f"  never dealt: {', '.join(never)}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([{"script": name, "residents": residents, "travelers": travelers,
+                        **histogram.to_dict()}
+                       for (name, residents, travelers), histogram in results.items()], 
+                      f, indent=2)
+    total = sum(histogram.setups for histogram in results.values())
+    print(f"{total} setups in {elapsed:.2f}s ({total / elapsed:.0f} setups/s)")
+    return 0
+
+def _enumerate(args) -> int:
+    """Count every legal setup per script and player count, exactly"""
+    names = args.script or list(compiled_scripts)
+    unknown = [name for name in names if name not in compiled_scripts]
+    if unknown:
+        print(f"Unknown script(s): {', '.join(unknown)}")
+        return 2
+    
+    report = []
+    for name in names:
+        script = compiled_scripts[name]
+        results = SetupEnumeration.cached_counts(script, args.residents, refresh=args.refresh)
+        dealt = set()
+        for residents, counts in results.items():
+            dealt.update(counts.role_chances)
+            outsiders = ", ".join(f"{count}: {float(chance):.1%}"
+                                  for count, chance in sorted(counts.outsider_chances.items()))
+            print(f"{name}, {residents} residents: {counts.bags} role sets, "
+                  f"outsiders in play: {outsiders or '-'}")
+            for message, chance in counts.errors.items():
+                print(f"  fails {float(chance):.2%} ({chance}): {message}")
+            report.append({"script": name, **counts.to_dict()})
+        never = [role for role_type in ("Townsfolk", "Outsider", "Minion", "Demon")
+                 for role in script[role_type] if role not in dealt]
+        if never:
+            print(f"{name}: never dealt: {', '.join(never)}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+def _stress_worker(directory: str, worker: int, games: int, players: int):
+    """Save games as fast as possible into the history in directory"""
+    os.chdir(directory)
+    for game in range(games):
+        MatchStorage.save_match(
+            [Player(f"w{worker}g{game}p{p}", "Chef", "Townsfolk") for p in range(players)],
+            "Townsfolk", f"w{worker}", "Trouble Brewing"
+        )
+
+def _check_stress_history(path: str, processes: int, games: int, 
+                          players: int) -> List[str]:
+    """List everything wrong with a history written by _stress_worker"""
+    problems = []
+    saved: Dict[str, List[str]] = {}  # game ID -> usernames in file order
+    current = None
+    with open(path, newline="", encoding=MATCH_HISTORY_ENCODING) as f:
+        for number, row in enumerate(csv.reader(f), 1):
+            if number == 1 and row == ["V", str(MatchStorage.FORMAT_VERSION)]:
+                continue
+            if len(row) == 5 and row[0] == "G":
+                if row[1] in saved:
+                    problems.append(f"line {number}: game ID {row[1]} used twice")
+                current = saved.setdefault(row[1], [])
+            elif len(row) == 5 and row[0] == "P" and current is not None:
+                current.append(row[2])
+            else:
+                problems.append(f"line {number}: malformed record {row!r}")
+    
+    expected = {f"w{w}g{g}": [f"w{w}g{g}p{p}" for p in range(players)]
+                for w in range(processes) for g in range(games)}
+    for game_id, usernames in saved.items():
+        key = usernames[0].rsplit("p", 1)[0] if usernames else None
+        if expected.pop(key, None) != usernames:
+            problems.append(f"game {game_id}: unexpected or interleaved rows")
+    problems.extend(f"game {key}: missing" for key in expected)
+    return problems
+
+def _stress(args) -> int:
+    """Append games from several processes at once and check nothing was mangled"""
+    with tempfile.TemporaryDirectory() as directory:
+        workers = [
+            multiprocessing.Process(target=_stress_worker, 
+                                    args=(directory, w, args.games, args.players))
+            for w in range(args.processes)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        
+        problems = [f"worker {w} exited with code {worker.exitcode}" 
+                    for w, worker in enumerate(workers) if worker.exitcode]
+        problems += _check_stress_history(os.path.join(directory, MATCH_HISTORY_FILE),
+                                          args.processes, args.games, args.players)
+    
+    for problem in problems[:20]:
+        print(problem)
+    total = args.processes * args.games
+    print(f"{total} games from {args.processes} processes in {elapsed:.2f}s "
+          f"({total / elapsed:.0f} games/s), {len(problems)} problem(s)")
+    return 1 if problems else 0
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser"""
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Grimoire maintenance commands (run without arguments for the app)"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    duplicates = commands.add_parser(
+        "duplicates", help="report usernames that are likely the same player"
+    )
+    duplicates.add_argument("--distance", type=int, default=1,
+                            help="maximum edit distance (default: 1)")
+    duplicates.add_argument("--min-length", type=int, default=4,
+                            help="ignore typo matches on shorter names (default: 4)")
+    duplicates.set_defaults(func=_duplicates)
+    
+    convert = commands.add_parser(
+        "convert", help="rewrite the CSV match history in the current file format"
+    )
+    convert.set_defaults(func=_convert)
+    
+    compact = commands.add_parser(
+        "compact", help="remove duplicate games and malformed lines from the CSV history"
+    )
+    compact.set_defaults(func=_compact)
+    
+    archive = commands.add_parser(
+        "archive", help="move the oldest games into compressed archive segments"
+    )
+    archive.add_argument("--keep", type=int, default=1000,
+                         help="games to leave in the history file (default: 1000)")
+    archive.add_argument("--segment-games", type=int, default=10000,
+                         help="games per archive segment (default: 10000)")
+    archive.set_defaults(func=_archive)
+    
+    export = commands.add_parser(
+        "export", help="write games to a CSV history or JSON Lines file"
+    )
+    export.add_argument("path", help="file to write (.jsonl for JSON Lines)")
+    export.add_argument("--format", choices=HistoryTransfer.FORMATS,
+                        help="file format (default: from the file extension)")
+    export.add_argument("--script", help="only games of this script")
+    export.add_argument("--storyteller", help="only games run by this storyteller")
+    export.add_argument("--since", type=_date, help="only games on or after YYYY-MM-DD")
+    export.add_argument("--until", type=_date, help="only games on or before YYYY-MM-DD")
+    export.set_defaults(func=_export)
+    
+    import_ = commands.add_parser(
+        "import", help="merge games from other CSV histories or JSON Lines files"
+    )
+    import_.add_argument("paths", nargs="+", help="files to import")
+    import_.set_defaults(func=_import)
+    
+    simulate = commands.add_parser(
+        "simulate", help="generate many setups per script and player count in parallel"
+    )
+    simulate.add_argument("--script", action="append",
+                          help="script to simulate, repeatable (default: all)")
+    simulate.add_argument("--residents", type=_residents, default=range(5, 16),
+                          help="resident count or MIN-MAX range (default: 5-15)")
+    simulate.add_argument("--travelers", type=int, nargs="+", default=[0],
+                          help="traveler counts (default: 0)")
+    simulate.add_argument("--setups", type=int, default=10000,
+                          help="setups per script and player count (default: 10000)")
+    simulate.add_argument("--seed", type=int, default=0,
+                          help="seed; the same seed gives the same report (default: 0)")
+    simulate.add_argument("--workers", type=int,
+                          help="worker processes (default: one per core)")
+    simulate.add_argument("--json", help="also write every cell's counts to this file")
+    simulate.set_defaults(func=_simulate)
+    
+    enumerate_ = commands.add_parser(
+        "enumerate", help="count every legal setup per script and player count exactly"
+    )
+    enumerate_.add_argument("--script", action="append",
+                            help="script to count, repeatable (default: all)")
+    enumerate_.add_argument("--residents", type=_residents, default=range(5, 16),
+                            help="resident count or MIN-MAX range (default: 5-15)")
+    enumerate_.add_argument("--refresh", action="store_true",
+                            help=f"recount instead of reading {SETUP_COUNTS_CACHE_DIR}/")
+    enumerate_.add_argument("--json",
+                            help="also write exact chances per role as fractions to this file")
+    enumerate_.set_defaults(func=_enumerate)
+    
+    stress = commands.add_parser(
+        "stress", help="check concurrent saves from several processes in a scratch history"
+    )
+    stress.add_argument("--processes", type=int, default=4,
+                        help="number of processes saving at once (default: 4)")
+    stress.add_argument("--games", type=int, default=1000,
+                        help="games saved by each process (default: 1000)")
+    stress.add_argument("--players", type=int, default=10,
+                        help="players per game (default: 10)")
+    stress.set_defaults(func=_stress)
+    
+    return parser
+
+def run_command(argv: List[str]) -> int:
+    """Run a command-line command and return its exit code"""
+    args = build_parser().parse_args(argv)
+    return args.func(args)
\ No newline at end of file
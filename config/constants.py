@@ -1,4 +1,29 @@
 MATCH_HISTORY_FILE = "match_history.csv"
+MATCH_HISTORY_ENCODING = "utf-8"
+# Decoding error handler for history files, registered in services.match_storage:
+# bytes that aren't UTF-8 were written by older versions in the locale encoding
+MATCH_HISTORY_ERRORS = "match_history_legacy"
+MATCH_HISTORY_DB = "match_history.db"
+STATS_INDEX_FILE = "match_history.stats.json"
+TABLE_SNAPSHOT_FILE = "match_history.snapshot"
+MATCH_ARCHIVE_DIR = "match_history.archive"
+MATCH_QUARANTINE_FILE = "match_history.rejected.csv"
+
+# Per-user data that is never shared goes under this name in the local
+# app data directory (see utils.helpers.local_data_dir)
+APP_DATA_NAME = "botc-grimoire"
+# Matches waiting to be saved, one journal per running instance, kept in
+# the local app data directory and replayed once that instance has stopped
+SAVE_JOURNAL_DIR = "pending_saves"
+
+# Exact setup counts per script, keyed on a hash of the script
+SETUP_COUNTS_CACHE_DIR = "setup_counts.cache"
+
+# Held while appending to or rewriting the history, by every process
+MATCH_HISTORY_LOCK_FILE = "match_history.lock"
+
+# Match storage backend: "csv" or "sqlite"
+STORAGE_BACKEND = "csv"
 
 MIN_PLAYERS = 5
 MAX_PLAYERS = 20
@@ -1,4 +1,6 @@
+import sys
 import tkinter as tk
+from cli import run_command
 from ui.main_window import MainWindow
 
 def main():
@@ -7,4 +9,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_command(sys.argv[1:]))
     main()
\ No newline at end of file
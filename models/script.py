@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import FrozenSet, Mapping, Tuple
+from config.constants import ROLE_DISTRIBUTION
+
+# Resident classes, in the order roles are looked up and listed
+ROLE_CLASSES = ("Townsfolk", "Outsider", "Minion", "Demon")
+
+@dataclass(frozen=True)
+class Script:
+    """
+    A script's roles compiled once for fast generation
+    Indexing by class works like the role dicts in scripts.py, but gives tuples
+    """
+    name: str
+    roles: Mapping[str, Tuple[str, ...]]  # class -> roles, in script order
+    role_sets: Mapping[str, FrozenSet[str]]  # class -> roles
+    role_classes: Mapping[str, str]  # resident role -> class
+    distributions: Mapping[int, Tuple[int, int, int, int]]  # residents -> counts
+    
+    @staticmethod
+    def compile(name: str, script_roles: Mapping) -> "Script":
+        """Build a Script from a role dict as found in scripts.py"""
+        roles = {role_type: tuple(script_roles.get(role_type, ()))
+                 for role_type in ROLE_CLASSES + ("Traveler",)}
+        role_classes = {}
+        for role_type in ROLE_CLASSES:
+            for role in roles[role_type]:
+                # The first class listing a role wins, as in the old list scans
+                role_classes.setdefault(role, role_type)
+        return Script(
+            name=name,
+            roles=MappingProxyType(roles),
+            role_sets=MappingProxyType({t: frozenset(r) for t, r in roles.items()}),
+            role_classes=MappingProxyType(role_classes),
+            distributions=MappingProxyType(dict(ROLE_DISTRIBUTION)),
+        )
+    
+    @staticmethod
+    def of(script_roles) -> "Script":
+        """Get a Script for either a Script or a role dict"""
+        if isinstance(script_roles, Script):
+            return script_roles
+        return Script.compile("", script_roles)
+    
+    def __reduce__(self):
+        # Mapping proxies can't be pickled, so worker processes recompile
+        return Script.compile, (self.name, {t: list(r) for t, r in self.roles.items()})
+    
+    def role_class(self, role: str) -> str:
+        """Get the class of a resident role, or "Unknown" """
+        return self.role_classes.get(role, "Unknown")
+    
+    def __getitem__(self, role_type: str) -> Tuple[str, ...]:
+        return self.roles[role_type]
+    
+    def get(self, role_type: str, default=()) -> Tuple[str, ...]:
+        """Get the roles of a class, like dict.get"""
+        return self.roles.get(role_type, default)
\ No newline at end of file
@@ -0,0 +1,93 @@
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from models.player import Player
+from models.script import Script
+
+# Role ID for "no role" in a SetupBatch
+NO_ROLE = 0xFFFF
+
+class Setup(NamedTuple):
+    """One generated game setup, before it is turned into Players"""
+    roles: List[str]  # role per seat, residents first, then travelers
+    residents: int
+    drunk_fake_role: Optional[str]  # what the Drunk thinks they are, if in play
+    twin: Optional[int]  # seat of the Evil Twin's good twin, if in play
+    bluffs: List[str]  # 3 bluffs for the Demon, "N/A" if the pool ran out
+    
+    def to_players(self, script: Script) -> Tuple[List[Player], List[str]]:
+        """The setup as RoleGenerator.generate_roles returns it"""
+        players = []
+        for seat, role in enumerate(self.roles):
+            is_traveler = seat >= self.residents
+            player = Player(
+                username="",  # Will be filled by UI
+                role=role,
+                player_class="Traveler" if is_traveler else script.role_class(role),
+                is_traveler=is_traveler
+            )
+            if role == "Drunk":
+                player.drunk_fake_role = self.drunk_fake_role
+                player.role = f"Drunk-{self.drunk_fake_role}"
+            if seat == self.twin:
+                # Marked by appending "-Evil Twin" to their role
+                player.role = f"{player.role}-Evil Twin"
+            players.append(player)
+        return players, list(self.bluffs)
+
+class SetupBatch:
+    """
+    Many setups of one script and player count, integer-coded
+    Roles are IDs into role_names, stored seat by seat in flat arrays
+    """
+    
+    def __init__(self, script: Script, num_residents: int, num_travelers: int):
+        self.script = script
+        self.num_residents = num_residents
+        self.seats = num_residents + num_travelers
+        
+        # Every role of the script, then the placeholders generation can use
+        self.role_names: List[str] = list(dict.fromkeys(
+            role for role_type in ("Townsfolk", "Outsider", "Minion", "Demon", "Traveler")
+            for role in script.get(role_type)
+        )) + ["Traveler", "unknown", "N/A"]
+        self.role_ids: Dict[str, int] = {role: i for i, role in enumerate(self.role_names)}
+        
+        self.roles = array("H")  # seats per setup
+        self.drunk_fake_roles = array("H")  # one per setup, NO_ROLE if no Drunk
+        self.twins = array("b")  # one per setup, -1 if no Evil Twin
+        self.bluffs = array("H")  # 3 per setup
+    
+    def __len__(self) -> int:
+        return len(self.twins)
+    
+    def append(self, setup: Setup):
+        """Add one setup"""
+        ids = self.role_ids
+        self.roles.extend([ids[role] for role in setup.roles])
+        self.drunk_fake_roles.append(
+            NO_ROLE if setup.drunk_fake_role is None else ids[setup.drunk_fake_role]
+        )
+        self.twins.append(-1 if setup.twin is None else setup.twin)
+        self.bluffs.extend([ids[role] for role in setup.bluffs])
+    
+    def setup(self, index: int) -> Setup:
+        """Decode one setup"""
+        names = self.role_names
+        start = index * self.seats
+        drunk = self.drunk_fake_roles[index]
+        twin = self.twins[index]
+        return Setup(
+            roles=[names[i] for i in self.roles[start:start + self.seats]],
+            residents=self.num_residents,
+            drunk_fake_role=None if drunk == NO_ROLE else names[drunk],
+            twin=None if twin < 0 else twin,
+            bluffs=[names[i] for i in self.bluffs[index * 3:index * 3 + 3]],
+        )
+    
+    def seat_roles(self, seat: int) -> array:
+        """Role ID at one seat in every setup, e.g. for counting"""
+        return self.roles[seat::self.seats]
+    
+    def players(self, index: int) -> Tuple[List[Player], List[str]]:
+        """One setup as RoleGenerator.generate_roles returns it"""
+        return self.setup(index).to_players(self.script)
\ No newline at end of file
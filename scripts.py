@@ -1,4 +1,5 @@
 # scripts.py
+from models.script import Script
 
 trouble_brewing = {
     "Townsfolk": [
@@ -105,3 +106,6 @@ scripts = {
     "A Lleech of Distrust": a_lleech_of_distrust,
     "Folie a Demone": folie_a_demone
 }
+
+# Compiled once at import; use these for generating roles
+compiled_scripts = {name: Script.compile(name, roles) for name, roles in scripts.items()}
@@ -0,0 +1,53 @@
+import hashlib
+import math
+from typing import Dict, Iterable
+
+class BloomFilter:
+    """
+    Compact set membership test with no false negatives
+    "x in bloom" may be True for a value never added (about error_rate of
+    the time), but is always True for one that was
+    """
+    
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+    
+    @staticmethod
+    def of(values: Iterable[str], error_rate: float = 0.01) -> "BloomFilter":
+        """Build a filter holding exactly these values"""
+        values = set(values)
+        bloom = BloomFilter(len(values), error_rate)
+        for value in values:
+            bloom.add(value)
+        return bloom
+    
+    def add(self, value: str):
+        """Add a value"""
+        for bit in self._bits_for(value):
+            self.bits[bit >> 3] |= 1 << (bit & 7)
+    
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[bit >> 3] & (1 << (bit & 7)) for bit in self._bits_for(value))
+    
+    def _bits_for(self, value: str) -> Iterable[int]:
+        """The bit positions for a value, stable across processes and runs"""
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * step) % self.size for i in range(self.hashes))
+    
+    def to_dict(self) -> Dict:
+        """Serialise for storing as JSON"""
+        return {"size": self.size, "hashes": self.hashes, "bits": self.bits.hex()}
+    
+    @staticmethod
+    def from_dict(data: Dict) -> "BloomFilter":
+        """Restore a filter saved with to_dict"""
+        bloom = BloomFilter(1)
+        bloom.size = data["size"]
+        bloom.hashes = data["hashes"]
+        bloom.bits = bytearray.fromhex(data["bits"])
+        return bloom
\ No newline at end of file
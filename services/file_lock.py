@@ -0,0 +1,77 @@
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    """
+    Exclusive lock shared by every process using the same lock file
+    Use as a context manager; entering blocks until the lock is free
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+    
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+    
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Take the lock, waiting for it unless blocking is False
+        Returns: False if it wasn't blocking and another holder has the lock
+        """
+        self._file = open(self.path, "a+b")
+        try:
+            if fcntl is not None:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                fcntl.flock(self._file.fileno(), flags)
+            else:
+                self._file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self._file.fileno(),
+                                       msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+                        # LK_LOCK gives up after about 10 seconds; keep waiting
+        except OSError:
+            self._file.close()
+            self._file = None
+            if blocking:
+                raise
+            return False
+        except BaseException:
+            self._file.close()
+            self._file = None
+            raise
+        return True
+    
+    def fileno(self) -> int:
+        """File descriptor of the held lock file"""
+        return self._file.fileno()
+    
+    def release(self):
+        """Give up the lock"""
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+def temp_path_for(path: str) -> str:
+    """A temporary file name next to path that no other process will use"""
+    return f"{path}.{os.getpid()}.tmp"
\ No newline at end of file
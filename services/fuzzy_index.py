@@ -0,0 +1,218 @@
+from array import array
+from bisect import bisect_left
+from itertools import chain, groupby
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+def levenshtein(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """
+    Edit distance between two strings, counting a swap of two adjacent
+    characters as one edit (optimal string alignment)
+    With max_distance, gives up early and returns max_distance + 1
+    """
+    if max_distance is not None and abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if max_distance == 1:
+        return _distance_up_to_one(a, b)
+    if len(a) > len(b):
+        a, b = b, a
+    
+    before_previous = None
+    previous = list(range(len(a) + 1))
+    for j, char_b in enumerate(b, 1):
+        current = [j]
+        for i, char_a in enumerate(a, 1):
+            cost = min(previous[i] + 1, current[i - 1] + 1,
+                       previous[i - 1] + (char_a != char_b))
+            if (i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b):
+                cost = min(cost, before_previous[i - 2] + 1)
+            current.append(cost)
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+def _distance_up_to_one(a: str, b: str) -> int:
+    """
+    levenshtein(a, b, 1) without the table: one edit is all that can be
+    left once the common prefix and suffix are stripped
+    """
+    shorter = min(len(a), len(b))
+    start = 0
+    while start < shorter and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < shorter - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    
+    if not a and not b:
+        return 0
+    if len(a) + len(b) == 1 or (len(a) == len(b) == 1):
+        return 1  # Insertion, deletion or substitution
+    if len(a) == len(b) == 2 and a == b[::-1]:
+        return 1  # Adjacent swap
+    return 2
+
+class FuzzyIndex:
+    """
+    Typo-tolerant username lookup (case-insensitive)
+    Each name is indexed under every string made by deleting up to
+    max_distance characters from it. Two names within that edit distance
+    always share one of these keys, so a query is a handful of lookups
+    plus an exact Levenshtein check on the few candidates.
+    Keys are stored as hashes, each packed with the name's number into one
+    sorted array, instead of as strings; a hash collision only adds a
+    candidate for the check to reject.
+    """
+    
+    # Low bits of a packed key hold the name's number, the rest its hash
+    ID_BITS = 28
+    HASH_BITS = 36
+    
+    def __init__(self, usernames: Iterable[str] = (), max_distance: int = 1):
+        self.max_distance = max_distance
+        self._lowered: List[str] = []  # name number -> lowercased name
+        self._usernames: List[Tuple[str, ...]] = []  # name number -> usernames
+        self._numbers: Dict[str, int] = {}  # lowercased name -> its number
+        self._count = 0
+        
+        # Bulk load: sort the keys once
+        keys = []
+        for username in usernames:
+            number = self._add_name(username)
+            if number is not None:
+                keys.extend(self._variant_keys(number))
+        self._keys = array("Q", sorted(keys))
+        
+        # Keys of names added later, hash -> name numbers, until the next merge
+        self._added: Dict[int, List[int]] = {}
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def add(self, username: str):
+        """Add a username to the index"""
+        number = self._add_name(username)
+        if number is None:
+            return
+        for key in self._variant_keys(number):
+            self._added.setdefault(key >> self.ID_BITS, []).append(number)
+    
+    def search(self, text: str, max_distance: Optional[int] = None,
+               limit: int = 10) -> List[Tuple[int, str]]:
+        """Get up to limit (distance, username) pairs, closest first"""
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        
+        lowered = text.lower()
+        results = []
+        for number in self._candidates(lowered):
+            distance = levenshtein(lowered, self._lowered[number], max_distance)
+            if distance <= max_distance:
+                results.extend((distance, u) for u in self._usernames[number])
+        
+        results.sort(key=lambda r: (r[0], r[1].lower()))
+        return results[:limit]
+    
+    def find_likely_duplicates(self, max_distance: Optional[int] = None,
+                               min_length: int = 4) -> List[Tuple[str, str, int]]:
+        """
+        Find pairs of usernames that are probably the same person
+        Names equal ignoring case are always reported; otherwise both names
+        must be at least min_length long and within max_distance edits.
+        Names sharing a deletion key sit together in the sorted keys, so
+        one pass over them finds every pair worth comparing.
+        Returns: (username, username, distance) tuples, closest first
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        self._merge_added()
+        
+        pairs = []
+        for usernames in self._usernames:
+            # Same name in different case
+            ordered = sorted(usernames)
+            pairs.extend((a, b, 0) for i, a in enumerate(ordered) for b in ordered[i + 1:])
+        
+        checked = set()
+        id_mask = (1 << self.ID_BITS) - 1
+        for _, run in groupby(self._keys, key=lambda key: key >> self.ID_BITS):
+            numbers = [key & id_mask for key in run]
+            for i, first in enumerate(numbers):
+                for second in numbers[i + 1:]:
+                    # A pair shares several keys; only compare it once
+                    pair = (first, second) if first < second else (second, first)
+                    if pair in checked:
+                        continue
+                    checked.add(pair)
+                    a, b = sorted((self._lowered[first], self._lowered[second]))
+                    if len(a) < min_length or len(b) < min_length:
+                        continue
+                    distance = levenshtein(a, b, max_distance)
+                    if distance <= max_distance:
+                        pairs.extend((x, y, distance) 
+                                     for x in self._usernames[self._numbers[a]]
+                                     for y in self._usernames[self._numbers[b]])
+        
+        pairs.sort(key=lambda p: (p[2], p[0].lower(), p[1].lower()))
+        return pairs
+    
+    def _add_name(self, username: str) -> Optional[int]:
+        """Record a username; returns its new number, or None if its name was known"""
+        self._count += 1
+        lowered = username.lower()
+        number = self._numbers.get(lowered)
+        if number is not None:
+            if username in self._usernames[number]:
+                self._count -= 1
+            else:
+                self._usernames[number] += (username,)
+            return None
+        
+        number = len(self._lowered)
+        if number >> self.ID_BITS:
+            raise ValueError(f"FuzzyIndex holds at most {1 << self.ID_BITS} names")
+        self._numbers[lowered] = number
+        self._lowered.append(lowered)
+        self._usernames.append((username,))
+        return number
+    
+    def _variant_keys(self, number: int) -> List[int]:
+        """Packed keys of a name's deletion variants"""
+        mask, shift = (1 << self.HASH_BITS) - 1, self.ID_BITS
+        return [(hash(variant) & mask) << shift | number 
+                for variant in self._variants(self._lowered[number])]
+    
+    def _hash(self, variant: str) -> int:
+        return hash(variant) & ((1 << self.HASH_BITS) - 1)
+    
+    def _candidates(self, lowered: str) -> Set[int]:
+        """Numbers of indexed names sharing a deletion variant with lowered"""
+        keys = self._keys
+        candidates = set()
+        for variant in self._variants(lowered):
+            hashed = self._hash(variant)
+            i = bisect_left(keys, hashed << self.ID_BITS)
+            while i < len(keys) and keys[i] >> self.ID_BITS == hashed:
+                candidates.add(keys[i] & ((1 << self.ID_BITS) - 1))
+                i += 1
+            candidates.update(self._added.get(hashed, ()))
+        return candidates
+    
+    def _merge_added(self):
+        """Move the keys of names added since the last merge into the array"""
+        if not self._added:
+            return
+        added = [hashed << self.ID_BITS | number 
+                 for hashed, numbers in self._added.items() for number in numbers]
+        self._keys = array("Q", sorted(chain(self._keys, added)))
+        self._added = {}
+    
+    def _variants(self, word: str) -> Set[str]:
+        """word plus every string made by deleting up to max_distance characters"""
+        variants = {word}
+        frontier = {word}
+        for _ in range(self.max_distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+            variants |= frontier
+        return variants
\ No newline at end of file
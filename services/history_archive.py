@@ -0,0 +1,85 @@
+import gzip
+import json
+import os
+import struct
+from typing import Dict, List
+from services.file_lock import temp_path_for
+
+class HistoryArchive:
+    """
+    Finished match history rolled into immutable, compressed segment files
+    
+    A segment is gzip-compressed history records (the same format as the
+    match history file), then a JSON summary, then an 8-byte trailer: the
+    summary's length and SEGMENT_MAGIC. The summary is read from the end
+    of the file without decompressing anything
+    """
+    
+    SEGMENT_MAGIC = b"SEG1"
+    SEGMENT_SUFFIX = ".seg"
+    
+    _TRAILER = struct.Struct(">I4s")
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+    
+    def segments(self) -> List[str]:
+        """Paths of every segment, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in sorted(names)
+                if name.endswith(self.SEGMENT_SUFFIX)]
+    
+    def total_size(self) -> int:
+        """Bytes on disk used by every segment"""
+        return sum(os.path.getsize(path) for path in self.segments())
+    
+    def add_segment(self, records: bytes, summary: Dict) -> str:
+        """Write a new segment after the existing ones and return its path"""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self.segments()
+        number = 1
+        if segments:
+            name = os.path.basename(segments[-1])
+            number = int(name[len("segment-"):-len(self.SEGMENT_SUFFIX)]) + 1
+        path = os.path.join(self.directory, f"segment-{number:05d}{self.SEGMENT_SUFFIX}")
+        self.write_segment(path, records, summary)
+        return path
+    
+    def write_segment(self, path: str, records: bytes, summary: Dict):
+        """Write a segment, atomically replacing any existing one at path"""
+        footer = json.dumps(summary, separators=(",", ":")).encode("utf-8")
+        temp_path = temp_path_for(path)
+        with open(temp_path, "wb") as f:
+            f.write(gzip.compress(records, mtime=0))
+            f.write(footer)
+            f.write(self._TRAILER.pack(len(footer), self.SEGMENT_MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    
+    def read_summary(self, path: str) -> Dict:
+        """Read just a segment's summary"""
+        with open(path, "rb") as f:
+            f.seek(-self._TRAILER.size, os.SEEK_END)
+            length = self._read_trailer(path, f.read(self._TRAILER.size))
+            f.seek(-self._TRAILER.size - length, os.SEEK_END)
+            return json.loads(f.read(length).decode("utf-8"))
+    
+    def read_records(self, path: str) -> bytes:
+        """Decompress a segment's history records"""
+        with open(path, "rb") as f:
+            data = f.read()
+        length = self._read_trailer(path, data[-self._TRAILER.size:])
+        return gzip.decompress(data[:len(data) - self._TRAILER.size - length])
+    
+    def _read_trailer(self, path: str, trailer: bytes) -> int:
+        """Check a segment's trailer and return its summary's length"""
+        if len(trailer) != self._TRAILER.size:
+            raise ValueError(f"{path} is not a history segment")
+        length, magic = self._TRAILER.unpack(trailer)
+        if magic != self.SEGMENT_MAGIC:
+            raise ValueError(f"{path} is not a history segment")
+        return length
\ No newline at end of file
@@ -0,0 +1,268 @@
+import queue
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+from models.player import Player
+from services.match_storage import MatchStorage
+from services.match_table import MatchTable
+from services.save_journal import SaveJournal
+from services.save_worker import SaveWorker
+from services.stats_index import StatsIndex
+
+class HistoryRepository:
+    """
+    The one in-memory copy of the match history, shared by every tab
+    Tabs read table/stats from here and subscribe to change events
+    instead of loading the history themselves
+    Storage is only read on background threads; the Tk main thread just
+    swaps in what they loaded
+    """
+    
+    # Events and the arguments their callbacks receive
+    LOADED = "loaded"                  # ()
+    MATCH_ADDED = "match_added"        # (game,) as returned by save_match
+    PLAYER_RENAMED = "player_renamed"  # (old_username, new_username)
+    SAVE_FAILED = "save_failed"        # (error,)
+    LOAD_PROGRESS = "load_progress"    # (done, total) in the storage's units
+    LOAD_FAILED = "load_failed"        # (error,)
+    
+    # How often the main thread checks on a background load
+    LOAD_POLL_INTERVAL_MS = 50
+    
+    # How often to look for games saved by other instances sharing the history
+    WATCH_INTERVAL_MS = 2000
+    
+    # How often the main thread checks on a background look for new games
+    CHECK_POLL_INTERVAL_MS = 50
+    
+    def __init__(self, root, storage):
+        self.root = root
+        self.storage = storage
+        self.table = MatchTable()
+        self.stats = StatsIndex()
+        self.loading = False
+        self._subscribers: Dict[str, List[Callable]] = {}
+        self._load_results: queue.Queue = queue.Queue()
+        self._reload_event = (self.LOADED, ())  # emitted when the load finishes
+        self._next_reload = None  # (event, args) asked for during a load
+        self._games_announced = 0  # games in table that subscribers know about
+        self._watching = False
+        self._check_results: queue.Queue = queue.Queue()
+        self._checking = False  # a look for new games is running
+        self._check_again = False  # and another was asked for meanwhile
+        
+        # All writes go through one background thread, in order; matches
+        # are journaled until saved, and any left from last time are saved now
+        self.writer = SaveWorker(root, storage, journal=SaveJournal())
+        self.retry_saves()
+    
+    def subscribe(self, event: str, callback: Callable):
+        """Call callback (on the Tk main thread) whenever event happens"""
+        self._subscribers.setdefault(event, []).append(callback)
+    
+    def unsubscribe(self, event: str, callback: Callable):
+        """Stop calling callback for event"""
+        if callback in self._subscribers.get(event, []):
+            self._subscribers[event].remove(callback)
+    
+    def _install(self, table: MatchTable, stats: StatsIndex):
+        """Use a freshly loaded table and stats, and start watching the file"""
+        self.table = table
+        self.stats = stats
+        self._games_announced = table.game_count()
+        
+        if not self._watching:
+            self._watching = True
+            self.root.after(self.WATCH_INTERVAL_MS, self._watch)
+    
+    def load_async(self):
+        """
+        Load the history on a background thread so the window opens at once
+        LOAD_PROGRESS is emitted as it goes, then LOADED (or LOAD_FAILED)
+        """
+        if self.loading:
+            return
+        self._reload(self.LOADED)
+    
+    def _reload(self, event: str, *args):
+        """
+        Load the history in the background, then emit event with args
+        Asked for during another load, it runs once that one has finished
+        """
+        if self.loading:
+            self._next_reload = (event, args)
+            return
+        self.loading = True
+        self._reload_event = (event, args)
+        threading.Thread(target=self._load_in_background, 
+                         name="history-loader", daemon=True).start()
+        self.root.after(self.LOAD_POLL_INTERVAL_MS, self._poll_load)
+    
+    def _load_in_background(self):
+        """Build the storage's shared table and stats, reporting progress"""
+        try:
+            for done, total in self.storage.iter_load():
+                self._load_results.put(("progress", (done, total)))
+            # Cheap now: only picks up games saved while loading
+            loaded = (self.storage.load_table(), self.storage.load_stats())
+        except Exception as e:
+            self._load_results.put(("failed", e))
+        else:
+            self._load_results.put(("done", loaded))
+    
+    def _poll_load(self):
+        """Pass background load results to subscribers on the main thread"""
+        progress = None
+        finished = None
+        while True:
+            try:
+                kind, value = self._load_results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                progress = value  # Only the latest is worth drawing
+            else:
+                finished = (kind, value)
+        
+        if progress is not None:
+            self._emit(self.LOAD_PROGRESS, *progress)
+        if finished is None:
+            self.root.after(self.LOAD_POLL_INTERVAL_MS, self._poll_load)
+            return
+        
+        self.loading = False
+        kind, value = finished
+        if kind == "failed":
+            self._emit(self.LOAD_FAILED, value)
+        else:
+            self._install(*value)
+            event, args = self._reload_event
+            self._emit(event, *args)
+        
+        if self._next_reload is not None:
+            event, args = self._next_reload
+            self._next_reload = None
+            self._reload(event, *args)
+    
+    def iter_matches(self, since: Optional[int] = None, until: Optional[int] = None,
+                     **criteria: str) -> Iterator[Dict]:
+        """
+        Stream loaded matches passing the filters, with the same arguments
+        as MatchStorage.iter_matches
+        """
+        table = self.table
+        for index in table.filter(**criteria):
+            if MatchStorage._in_time_range(table.value("game_id", index), since, until):
+                yield table.row(index)
+    
+    def get_game(self, game_id: str) -> Optional[Dict]:
+        """Get one loaded game by its ID (see MatchStorage.get_game)"""
+        game = self.table.find_game(game_id)
+        return None if game is None else self.table.game_record(game)
+    
+    def save_match(self, players: List[Player], winning_team: str,
+                   storyteller: str, script: str):
+        """Save a match in the background; MATCH_ADDED follows once it's on disk"""
+        self.writer.submit(players, winning_team, storyteller, script,
+                           on_done=self._on_match_saved, 
+                           on_error=lambda e: self._emit(self.SAVE_FAILED, e))
+    
+    def retry_saves(self) -> int:
+        """
+        Queue matches that were never saved (a failed save, or a crash
+        before the save ran) again
+        Returns: the number of matches queued
+        """
+        return self.writer.submit_pending(
+            on_done=self._on_match_saved,
+            on_error=lambda e: self._emit(self.SAVE_FAILED, e)
+        )
+    
+    def rename_player(self, old_username: str, new_username: str,
+                      on_error: Optional[Callable[[Exception], None]] = None):
+        """Rename a player everywhere; PLAYER_RENAMED follows once it's done"""
+        self.writer.run(
+            self.storage.rename_player, (old_username, new_username),
+            on_done=lambda changed: self._on_player_renamed(
+                old_username, new_username, changed),
+            on_error=on_error
+        )
+    
+    def close(self):
+        """Finish pending writes"""
+        self.writer.shutdown()
+    
+    def _on_match_saved(self, game: Dict):
+        """Catch up with a saved game and announce it"""
+        self._check()
+    
+    def _watch(self):
+        """Pick up games that other processes appended to the shared history"""
+        self._check()
+        self.root.after(self.WATCH_INTERVAL_MS, self._watch)
+    
+    def _check(self):
+        """Look for new games on a background thread; _catch_up announces them"""
+        if self.loading:
+            return  # Picked up when the load finishes
+        if self._checking:
+            self._check_again = True
+            return
+        self._checking = True
+        threading.Thread(target=self._check_in_background, 
+                         name="history-watcher", daemon=True).start()
+        self.root.after(self.CHECK_POLL_INTERVAL_MS, self._poll_check)
+    
+    def _check_in_background(self):
+        """Bring the storage's table and stats up to date with the file"""
+        try:
+            # Both only pick up what was appended since the last call
+            self._check_results.put((self.storage.load_table(), 
+                                     self.storage.load_stats()))
+        except Exception as e:
+            self._check_results.put(e)
+    
+    def _poll_check(self):
+        """Announce what a background look found, on the main thread"""
+        try:
+            result = self._check_results.get_nowait()
+        except queue.Empty:
+            self.root.after(self.CHECK_POLL_INTERVAL_MS, self._poll_check)
+            return
+        
+        self._checking = False
+        if isinstance(result, Exception):
+            # Reported like any Tk callback error; the next look tries again
+            self.root.report_callback_exception(type(result), result, 
+                                                result.__traceback__)
+        elif not self.loading:
+            # A load that started meanwhile announces everything itself
+            self._catch_up(*result)
+        
+        if self._check_again:
+            self._check_again = False
+            self._check()
+    
+    def _catch_up(self, table: MatchTable, stats: StatsIndex):
+        """Announce every game added to the history since the last announcement"""
+        self.stats = stats
+        if table is not self.table:
+            # Rewritten by another process (e.g. a rename): start over
+            self.table = table
+            self._games_announced = table.game_count()
+            self._emit(self.LOADED)
+            return
+        
+        # Games are announced in file order, whoever saved them
+        for game in range(self._games_announced, table.game_count()):
+            self._games_announced = game + 1
+            self._emit(self.MATCH_ADDED, table.game_record(game))
+    
+    def _on_player_renamed(self, old_username: str, new_username: str, changed: int):
+        """Reload in the background after a rename rewrote the history"""
+        if changed:
+            self._reload(self.PLAYER_RENAMED, old_username, new_username)
+    
+    def _emit(self, event: str, *args):
+        """Call every subscriber of event"""
+        for callback in list(self._subscribers.get(event, [])):
+            callback(*args)
\ No newline at end of file
@@ -0,0 +1,161 @@
+import hashlib
+import json
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Set, Tuple
+from config.constants import MATCH_HISTORY_ENCODING, MATCH_HISTORY_ERRORS
+from services.match_storage import MatchStorage
+from services.match_table import COLUMNS, GAME_COLUMNS
+
+# Player fields, after the game fields in COLUMNS order
+PLAYER_COLUMNS = COLUMNS[len(GAME_COLUMNS):]
+
+class HistoryTransfer:
+    """
+    Streams whole games between a storage backend and CSV or JSON Lines files
+    
+    CSV files use the history file format, so an export can be used as
+    another group's match_history.csv. JSON Lines files hold one game per
+    line: its GAME_COLUMNS fields plus "players", a list of objects with
+    the PLAYER_COLUMNS fields ("result" may be left out)
+    """
+    
+    FORMATS = ("csv", "jsonl")
+    
+    # Games appended per write (and lock) while importing
+    IMPORT_BATCH_GAMES = 1000
+    
+    @staticmethod
+    def export_games(storage, f: IO[str], file_format: str = "csv",
+                     script: Optional[str] = None, storyteller: Optional[str] = None,
+                     since: Optional[int] = None, until: Optional[int] = None) -> int:
+        """
+        Write every game passing the filters to a text file opened with
+        newline="" (see iter_matches for since/until)
+        Returns: number of games written
+        """
+        values = (tuple(match[c] for c in COLUMNS) for match in storage.iter_matches(
+            script=script, storyteller=storyteller, since=since, until=until
+        ))
+        
+        if file_format == "csv":
+            f.write(MatchStorage._format_version())
+        games = 0
+        for rows in MatchStorage._iter_games(values):
+            if file_format == "csv":
+                f.write(MatchStorage._format_games([rows]))
+            else:
+                f.write(HistoryTransfer._format_json(rows) + "\n")
+            games += 1
+        return games
+    
+    @staticmethod
+    def import_games(storage, games: Iterable[List[Tuple[str, ...]]]) -> Dict[str, int]:
+        """
+        Append games that aren't already in the history, in batches
+        A game is already there if one was saved in the same second with
+        the same fields and roster (see game_key). A new game whose ID is
+        taken gets the next free "-sequence" ID of its second, so IDs stay
+        unique and it keeps its date
+        Returns: counts of games "added" (including those "renumbered") and
+        "duplicates" skipped
+        """
+        # One small digest and the ID per existing game, never its rows
+        existing = set()
+        game_ids = set()
+        for rows in MatchStorage._iter_games(
+                tuple(match[c] for c in COLUMNS) for match in storage.iter_matches()):
+            existing.add(HistoryTransfer.game_key(rows))
+            game_ids.add(rows[0][0])
+        
+        counts = {"added": 0, "renumbered": 0, "duplicates": 0}
+        batch = []
+        for rows in games:
+            key = HistoryTransfer.game_key(rows)
+            if key in existing:
+                counts["duplicates"] += 1
+                continue
+            existing.add(key)
+            if rows[0][0] in game_ids:
+                game_id = HistoryTransfer._free_game_id(rows[0][0], game_ids)
+                rows = [(game_id, *row[1:]) for row in rows]
+                counts["renumbered"] += 1
+            game_ids.add(rows[0][0])
+            batch.append(rows)
+            if len(batch) >= HistoryTransfer.IMPORT_BATCH_GAMES:
+                storage.append_games(batch)
+                counts["added"] += len(batch)
+                batch = []
+        if batch:
+            storage.append_games(batch)
+            counts["added"] += len(batch)
+        return counts
+    
+    @staticmethod
+    def _free_game_id(game_id: str, game_ids: Set[str]) -> str:
+        """The first "second-sequence" ID of game_id's second not in game_ids"""
+        second = game_id.split("-", 1)[0]
+        sequence = 1
+        while f"{second}-{sequence}" in game_ids:
+            sequence += 1
+        return f"{second}-{sequence}"
+    
+    @staticmethod
+    def iter_file_games(path: str, rejected: Optional[List] = None
+                        ) -> Iterator[List[Tuple[str, ...]]]:
+        """
+        Read games from a CSV history (either format) or JSON Lines file,
+        one at a time. Malformed lines are skipped, and added to rejected
+        if it is given
+        """
+        with open(path, newline="", encoding=MATCH_HISTORY_ENCODING,
+                  errors=MATCH_HISTORY_ERRORS) as f:
+            first = f.read(1)
+            f.seek(0)
+            if first == "{":
+                values = HistoryTransfer._iter_json_values(f, rejected)
+            else:
+                values = MatchStorage._iter_values(f, rejected=rejected)
+            yield from MatchStorage._iter_games(values)
+    
+    @staticmethod
+    def game_key(rows: List[Tuple[str, ...]]) -> bytes:
+        """
+        Digest of a game's save time, fields and roster, in any player order
+        The ID's "-sequence" is left out, so a game renumbered on import is
+        still recognised when the same file is imported again
+        """
+        game = (rows[0][0].split("-", 1)[0], *rows[0][1:len(GAME_COLUMNS)])
+        roster = sorted(row[len(GAME_COLUMNS):] for row in rows)
+        return hashlib.blake2b(repr((game, roster)).encode("utf-8"),
+                               digest_size=16).digest()
+    
+    @staticmethod
+    def _format_json(rows: List[Tuple[str, ...]]) -> str:
+        """Format one game as a JSON Lines record"""
+        record = dict(zip(GAME_COLUMNS, rows[0]))
+        record["players"] = [dict(zip(PLAYER_COLUMNS, row[len(GAME_COLUMNS):]))
+                             for row in rows]
+        return json.dumps(record, ensure_ascii=False)
+    
+    @staticmethod
+    def _iter_json_values(lines: Iterable[str],
+                          rejected: Optional[List]) -> Iterator[Tuple[str, ...]]:
+        """Parse JSON Lines games into tuples of values in COLUMNS order"""
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                game = tuple(str(record[c]) for c in GAME_COLUMNS)
+                rows = []
+                for player in record["players"]:
+                    result = player.get("result") or (
+                        "Win" if MatchStorage._is_player_winner(player["class"], game[1])
+                        else "Loss"
+                    )
+                    rows.append(game + (str(player["class"]), str(player["username"]),
+                                        str(player["role"]), str(result)))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                if rejected is not None:
+                    rejected.append(line.rstrip("\r\n"))
+                continue
+            yield from rows
\ No newline at end of file
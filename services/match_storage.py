@@ -1,75 +1,1167 @@
+import codecs
 import csv
+import hashlib
+import io
+import locale
 import os
+import threading
 import time
-from typing import List, Dict
-from config.constants import MATCH_HISTORY_FILE
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+from config.constants import (MATCH_ARCHIVE_DIR, MATCH_HISTORY_FILE, MATCH_HISTORY_ENCODING, 
+                              MATCH_HISTORY_ERRORS, MATCH_HISTORY_LOCK_FILE, MATCH_QUARANTINE_FILE, 
+                              STATS_INDEX_FILE, TABLE_SNAPSHOT_FILE)
 from models.player import Player
+from services.bloom_filter import BloomFilter
+from services.file_lock import FileLock, temp_path_for
+from services.history_archive import HistoryArchive
+from services.match_table import COLUMNS, GAME_COLUMNS, MatchTable
+from services.stats_index import StatsIndex
+
+# Older versions wrote the history in the locale encoding; where that was
+# already UTF-8, a non-UTF-8 file most likely came from Windows
+LEGACY_ENCODING = locale.getpreferredencoding(False)
+if codecs.lookup(LEGACY_ENCODING).name == "utf-8":
+    LEGACY_ENCODING = "cp1252"
+
+def _decode_legacy(error: UnicodeDecodeError) -> Tuple[str, int]:
+    """
+    Decoding error handler for history files (MATCH_HISTORY_ERRORS): bytes
+    that aren't UTF-8 are read as LEGACY_ENCODING, so one old line doesn't
+    stop the whole history from loading
+    """
+    data = error.object[error.start:error.end]
+    return data.decode(LEGACY_ENCODING, errors="replace"), error.end
+
+codecs.register_error(MATCH_HISTORY_ERRORS, _decode_legacy)
+
+class _ParsePosition:
+    """How far into the history file has been parsed, and how to spot rewrites"""
+    
+    # Bytes kept from just before the parsed offset to detect rewrites
+    TAIL_CHECK_BYTES = 256
+    
+    def __init__(self, path: Optional[str] = None, offset: int = 0, 
+                 tail: bytes = b"", size: int = -1, mtime: float = 0.0,
+                 game: Optional[Tuple[str, ...]] = None, inode: int = 0):
+        self.path = path
+        self.offset = offset
+        self.tail = tail
+        self.size = size
+        self.mtime = mtime
+        
+        # Rewrites replace the file, so a new inode means start over even
+        # if the tail still matches (0 if not known)
+        self.inode = inode
+        
+        # Header of the game being read, for player records after the offset
+        self.game = game
+    
+    def is_current(self, path: str) -> bool:
+        """Check whether everything in the file has been read"""
+        stat = os.stat(path)
+        return path == self.path and stat.st_size == self.size and stat.st_mtime == self.mtime
+    
+    def read_appended(self, path: str, max_bytes: Optional[int] = None,
+                      game_offsets: Optional[Dict[str, int]] = None,
+                      stop: Optional[int] = None) -> Optional[Iterator[Tuple[str, ...]]]:
+        """
+        Parse the complete rows appended since the last read, or only about
+        max_bytes of them, and nothing past offset stop (see is_current)
+        The file offset of each new game is added to game_offsets, if given
+        Returns None if the file was truncated or rewritten in the meantime
+        """
+        appended = self.read_appended_data(path, max_bytes, game_offsets, stop)
+        if appended is None:
+            return None
+        return MatchStorage._parse_data(*appended)
+    
+    def read_appended_data(self, path: str, max_bytes: Optional[int] = None,
+                           game_offsets: Optional[Dict[str, int]] = None,
+                           stop: Optional[int] = None
+                           ) -> Optional[Tuple[bytes, Optional[Tuple[str, ...]]]]:
+        """
+        As read_appended, but return the unparsed lines and the header of
+        the game any player records at their start belong to
+        """
+        stat = os.stat(path)
+        if path == self.path and stat.st_size == self.size and stat.st_mtime == self.mtime:
+            return b"", self.game
+        size = stat.st_size if stop is None else min(stop, stat.st_size)
+        
+        with open(path, "rb") as f:
+            if (path != self.path or not self._is_prefix_of(f, stat.st_size)
+                    or self.inode not in (0, stat.st_ino)):
+                if self.offset:
+                    return None
+                self.path = path
+            self.inode = stat.st_ino
+            
+            f.seek(self.offset)
+            remaining = max(0, size - self.offset)
+            data = f.read(remaining if max_bytes is None else min(max_bytes, remaining))
+            if b"\n" not in data:
+                # A single line longer than max_bytes
+                data += f.read(remaining - len(data))
+        
+        # Only consume complete lines; a partial last line is picked up later
+        end = data.rfind(b"\n") + 1
+        game = self.game
+        self.game = MatchStorage._last_game_header(data[:end]) or game
+        if game_offsets is not None:
+            MatchStorage._index_games(data[:end], self.offset, game_offsets)
+        self.offset += end
+        self.tail = (self.tail + data[:end])[-self.TAIL_CHECK_BYTES:]
+        if self.offset + (len(data) - end) >= stat.st_size:
+            self.size = stat.st_size
+            self.mtime = stat.st_mtime
+        
+        return data[:end], game
+    
+    def advance(self, start: int, data: bytes) -> bool:
+        """
+        Record bytes this process just appended at start, if nothing else
+        was appended before them. Returns False if the caller must re-read
+        """
+        if self.path is None or start != self.offset:
+            return False
+        stat = os.stat(self.path)
+        if self.inode not in (0, stat.st_ino):
+            return False
+        self.offset += len(data)
+        self.tail = (self.tail + data)[-self.TAIL_CHECK_BYTES:]
+        self.game = MatchStorage._last_game_header(data) or self.game
+        if stat.st_size == self.offset:
+            self.size = stat.st_size
+            self.mtime = stat.st_mtime
+        return True
+    
+    def can_continue(self, path: str) -> bool:
+        """Check rows appended since can be read from here (see read_appended)"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if path != self.path or self.inode not in (0, stat.st_ino):
+            return False
+        with open(path, "rb") as f:
+            return self._is_prefix_of(f, stat.st_size)
+    
+    def _is_prefix_of(self, f, size: int) -> bool:
+        """Check the bytes parsed so far are still at the start of the file"""
+        if size < self.offset:
+            return False
+        f.seek(self.offset - len(self.tail))
+        return f.read(len(self.tail)) == self.tail
+    
+    def to_dict(self) -> Dict:
+        """Serialise for storing next to derived data"""
+        return {"path": self.path, "offset": self.offset, "tail": self.tail.hex(),
+                "size": self.size, "mtime": self.mtime, 
+                "game": list(self.game) if self.game else None, "inode": self.inode}
+    
+    @staticmethod
+    def from_dict(data: Dict) -> "_ParsePosition":
+        """Restore a position saved with to_dict"""
+        game = data.get("game")
+        return _ParsePosition(data["path"], data["offset"], 
+                              bytes.fromhex(data["tail"]), data["size"], data["mtime"],
+                              tuple(game) if game else None, data.get("inode", 0))
+
+class _HistoryCache:
+    """
+    Process-wide cache of parsed match history, held as a MatchTable
+    Archived games come first, then the history file's
+    Only used while holding _cache_lock; other threads invalidate it
+    instead of clearing it under the feet of a refresh
+    """
+    
+    # Rewrite the snapshot once this much has been parsed from the file since
+    SNAPSHOT_MIN_NEW_BYTES = 1 << 20
+    
+    # Below this, starting worker processes costs more than it saves
+    PARALLEL_MIN_BYTES = 16 << 20
+    
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        """Forget everything parsed so far"""
+        self.invalid = False
+        self.position = _ParsePosition()
+        self.table = MatchTable()
+        self.game_offsets: Dict[str, int] = {}  # game ID -> offset of its first line
+        self.snapshot_offset = 0  # file offset the snapshot on disk covers
+        self.archive_loaded = False
+        self.archive_segments = 0  # segments added so far
+        self.archive_bytes = 0  # their compressed size
+    
+    def invalidate(self):
+        """
+        Mark the cache out of date after a rewrite, from any thread without
+        taking _cache_lock; it is cleared the next time it is used
+        """
+        self.invalid = True
+    
+    def clear_if_invalid(self):
+        """Clear the cache if it was invalidated (call with _cache_lock held)"""
+        if self.invalid:
+            self.clear()
+    
+    def load_archive(self) -> Iterator[int]:
+        """
+        Add every archived game to the (empty) table, carrying on from
+        where an earlier call stopped; _cache_lock is held for each segment
+        Yields the compressed bytes read so far after each segment
+        """
+        while True:
+            with _cache_lock:
+                self.clear_if_invalid()
+                if self.archive_loaded:
+                    return
+                segments = _archive.segments()
+                if self.archive_segments >= len(segments):
+                    self.archive_loaded = True
+                    return
+                segment = segments[self.archive_segments]
+                self.table.extend_values(MatchStorage._iter_segment_values(segment))
+                self.archive_segments += 1
+                self.archive_bytes += os.path.getsize(segment)
+                loaded = self.archive_bytes
+            yield loaded
+    
+    def load_snapshot(self, path: str, snapshot_path: str):
+        """
+        Start a cold cache from a binary snapshot of the table, so only rows
+        appended since it was written need parsing. refresh still checks the
+        snapshot's tail against the file and starts over if it was rewritten
+        """
+        self.clear_if_invalid()
+        if self.position.path is not None:
+            return
+        snapshot = MatchTable.load(snapshot_path)
+        if snapshot is None:
+            return
+        
+        table, source = snapshot
+        position = _ParsePosition.from_dict(source["position"])
+        if position.path == path:
+            self.table = table
+            self.position = position
+            self.game_offsets = source["game_offsets"]
+            self.snapshot_offset = position.offset
+            self.archive_loaded = True
+    
+    def save_snapshot(self, snapshot_path: str):
+        """Rewrite the snapshot if enough has been parsed since the last one"""
+        if self.position.offset - self.snapshot_offset >= self.SNAPSHOT_MIN_NEW_BYTES:
+            self.table.save(snapshot_path, {"position": self.position.to_dict(),
+                                            "game_offsets": self.game_offsets})
+            self.snapshot_offset = self.position.offset
+    
+    def refresh(self, path: str, max_bytes: Optional[int] = None, workers: int = 1):
+        """
+        Bring the cache up to date with the file on disk (or max_bytes closer)
+        With workers > 1, a large backlog is parsed in that many processes
+        """
+        self.clear_if_invalid()
+        if self.position.is_current(path):
+            return
+        
+        stop = MatchStorage._committed_size()
+        appended = self.position.read_appended_data(path, max_bytes, self.game_offsets, stop)
+        if appended is None:
+            # Truncated or rewritten: start over
+            self.clear()
+            appended = self.position.read_appended_data(path, max_bytes, 
+                                                        self.game_offsets, stop)
+        if not self.archive_loaded:
+            for _ in self.load_archive():
+                pass
+        
+        data, game = appended
+        if workers > 1 and len(data) >= self.PARALLEL_MIN_BYTES:
+            for chunk in MatchStorage._parse_parallel(data, game, workers):
+                self.table.extend_table(chunk)
+        else:
+            self.table.extend_values(MatchStorage._parse_data(data, game))
+    
+    def is_warm(self, path: str) -> bool:
+        """Check whether this file has already been loaded into the cache"""
+        return not self.invalid and path == self.position.path
+
+_history_cache = _HistoryCache()
+# Held while using _history_cache. Never taken while holding the file lock,
+# since a refresh takes the file lock with it held (see _committed_size)
+_cache_lock = threading.RLock()
+_archive = HistoryArchive(MATCH_ARCHIVE_DIR)
+
+# Last game ID issued by this process, as (second, sequence)
+_last_game_id = (0, 0)
+_game_id_lock = threading.Lock()
+
+# Shared stats index, loaded on first use
+_stats_index: Optional[StatsIndex] = None
+_stats_lock = threading.Lock()
+_stats_saved_at = float("-inf")
 
 class MatchStorage:
-    """Handles saving and loading match history"""
+    """
+    Handles saving and loading match history
+    
+    The file is written in format version 2: a "V,2" record first, then
+    for each game a "G,game_id,winner,storyteller,script" header followed
+    by one "P,class,username,role,result" record per player. Legacy rows
+    ("game_id|winner|storyteller|script,class,username,role[,result]") are
+    still read, even mixed in with version 2 records; convert_history
+    rewrites them.
+    
+    archive_history moves older games into compressed segments (see
+    HistoryArchive). Every read includes them, before the file's games.
+    """
+    
+    FORMAT_VERSION = 2
+    
+    # How far back from the end of the file save_match looks for the last game
+    GAME_ID_SEARCH_BYTES = 1 << 16
+    
+    # Minimum seconds between rewrites of the stats sidecar
+    STATS_SAVE_INTERVAL = 5.0
+    
+    # Version of the summary stored in each archive segment
+    SEGMENT_SUMMARY_VERSION = 1
+    
+    # A game saved again this soon with the same result and players is a
+    # double-clicked save, which compact_history removes
+    DUPLICATE_SAVE_SECONDS = 10
     
     @staticmethod
     def save_match(players: List[Player], winning_team: str, 
-                   storyteller: str, script: str):
-        """Save a match to the CSV file"""
-        game_id = str(int(time.time()))
-        match_id = f"{game_id}|{winning_team}|{storyteller}|{script}"
-        
-        with open(MATCH_HISTORY_FILE, "a", newline="") as f:
-            writer = csv.writer(f)
+                   storyteller: str, script: str) -> Dict:
+        """
+        Save a match to the CSV file
+        Other processes may be appending to the same file; the lock keeps
+        each game's records together
+        Returns: the saved game (game_id, winner, storyteller, script and
+        its rows in the load_matches format)
+        """
+        with FileLock(MATCH_HISTORY_LOCK_FILE), open(MATCH_HISTORY_FILE, "a+b") as f:
+            start = f.seek(0, os.SEEK_END)
+            f.seek(max(0, start - MatchStorage.GAME_ID_SEARCH_BYTES))
+            tail = f.read()
+            if start > len(tail):
+                tail = tail[tail.find(b"\n") + 1:]  # Drop the partial first line
+            
+            # Newer than any game another process has saved
+            latest = MatchStorage._last_game_header(tail)
+            game_id = MatchStorage._new_game_id(latest[0] if latest else None)
+            rows = []
             for player in players:
                 role = player.get_actual_role()
                 player_won = MatchStorage._is_player_winner(
                     player.player_class, winning_team
                 )
-                
-                writer.writerow([
-                    match_id,
-                    player.player_class,
-                    player.username,
-                    role,
-                    "Win" if player_won else "Loss"
-                ])
-    
-    @staticmethod
-    def load_matches() -> List[Dict]:
-        """Load all matches from the CSV file"""
-        if not os.path.exists(MATCH_HISTORY_FILE):
-            return []
+                result = "Win" if player_won else "Loss"
+                rows.append((game_id, winning_team, storyteller, script,
+                             player.player_class, player.username, role, result))
+            
+            # Build the whole game first so it reaches the file in one write
+            data = MatchStorage._format_games([rows]).encode(MATCH_HISTORY_ENCODING)
+            if start == 0:
+                data = MatchStorage._format_version().encode(MATCH_HISTORY_ENCODING) + data
+            elif not tail.endswith(b"\n"):
+                # A writer died mid-line; end that line so the header starts its own
+                data = b"\r\n" + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
         
-        matches = []
-        with open(MATCH_HISTORY_FILE, newline="") as f:
-            reader = csv.reader(f)
-            for row in reader:
-                if len(row) < 4:
+        MatchStorage._record_stats(rows, start, data)
+        return MatchStorage._game_record(rows)
+    
+    @staticmethod
+    def append_games(games: Sequence[Sequence[Tuple[str, ...]]]):
+        """
+        Append whole games, each given as its rows' values, keeping their IDs
+        Used for imports; save_match is the way to record a new game
+        """
+        with FileLock(MATCH_HISTORY_LOCK_FILE), open(MATCH_HISTORY_FILE, "a+b") as f:
+            start = f.seek(0, os.SEEK_END)
+            f.seek(max(0, start - 1))
+            last = f.read()
+            
+            data = MatchStorage._format_games(games).encode(MATCH_HISTORY_ENCODING)
+            if start == 0:
+                data = MatchStorage._format_version().encode(MATCH_HISTORY_ENCODING) + data
+            elif last != b"\n":
+                data = b"\r\n" + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        MatchStorage._record_stats([row for rows in games for row in rows], start, data)
+    
+    @staticmethod
+    def rename_player(old_username: str, new_username: str) -> int:
+        """
+        Rename a player throughout the history file and archive
+        Returns: number of rows changed
+        """
+        with FileLock(MATCH_HISTORY_LOCK_FILE):
+            if not os.path.exists(MATCH_HISTORY_FILE):
+                return 0
+            
+            # Archived segments are only rewritten if they hold the player
+            changed = 0
+            for segment in _archive.segments():
+                summary = _archive.read_summary(segment)
+                if old_username not in BloomFilter.from_dict(summary["usernames"]):
                     continue
-                
-                match_id = row[0]
-                parts = match_id.split("|")
-                
-                if len(parts) != 4:
+                text = _archive.read_records(segment).decode(MATCH_HISTORY_ENCODING)
+                renamed = io.StringIO(newline="")
+                count = MatchStorage._rename_lines(io.StringIO(text, newline=""), renamed,
+                                                   old_username, new_username)
+                if count:
+                    MatchStorage._write_segment(renamed.getvalue(), segment)
+                    changed += count
+            
+            temp_path = temp_path_for(MATCH_HISTORY_FILE)
+            with open(MATCH_HISTORY_FILE, newline="", encoding=MATCH_HISTORY_ENCODING,
+                      errors=MATCH_HISTORY_ERRORS) as src, \
+                 open(temp_path, "w", newline="", encoding=MATCH_HISTORY_ENCODING) as dst:
+                count = MatchStorage._rename_lines(src, dst, old_username, new_username)
+                dst.flush()
+                os.fsync(dst.fileno())
+            
+            changed += count
+            if changed:
+                # Replaced even if only the archive changed, so other
+                # processes see the file was rewritten
+                os.replace(temp_path, MATCH_HISTORY_FILE)
+                MatchStorage._forget_derived_data()
+            else:
+                os.remove(temp_path)
+        return changed
+    
+    @staticmethod
+    def _rename_lines(src, dst, old_username: str, new_username: str) -> int:
+        """Copy history lines from src to dst, renaming a player; returns rows changed"""
+        changed = 0
+        writer = csv.writer(dst)
+        for line in src:
+            # Lines that can't mention the player are copied untouched
+            if old_username in line or '"' in old_username:
+                row = next(csv.reader([line]), [])
+                # Legacy rows and player records both have the username third
+                if (len(row) >= 3 and row[0] not in ("V", "G") 
+                        and row[2] == old_username):
+                    row[2] = new_username
+                    writer.writerow(row)
+                    changed += 1
                     continue
-                
-                game_id, winner, storyteller, script = parts
-                
-                # Handle old format without result field
-                if len(row) >= 5:
-                    result = row[4]
+            dst.write(line)
+        return changed
+    
+    @staticmethod
+    def convert_history() -> int:
+        """
+        Rewrite the history file in the current format, converting legacy rows
+        Returns: number of games written
+        """
+        with FileLock(MATCH_HISTORY_LOCK_FILE):
+            if not os.path.exists(MATCH_HISTORY_FILE):
+                return 0
+            
+            games = 0
+            temp_path = temp_path_for(MATCH_HISTORY_FILE)
+            with open(MATCH_HISTORY_FILE, newline="", encoding=MATCH_HISTORY_ENCODING,
+                      errors=MATCH_HISTORY_ERRORS) as src, \
+                 open(temp_path, "w", newline="", encoding=MATCH_HISTORY_ENCODING) as dst:
+                dst.write(MatchStorage._format_version())
+                for rows in MatchStorage._iter_games(MatchStorage._iter_values(src)):
+                    dst.write(MatchStorage._format_games([rows]))
+                    games += 1
+                dst.flush()
+                os.fsync(dst.fileno())
+            
+            os.replace(temp_path, MATCH_HISTORY_FILE)
+            MatchStorage._forget_derived_data()
+        return games
+    
+    @staticmethod
+    def compact_history() -> Dict[str, int]:
+        """
+        Rewrite the history file in the current format without duplicate
+        games or malformed lines, which are appended to MATCH_QUARANTINE_FILE
+        Returns: counts of "games" written, duplicate saves removed
+        ("duplicates") and "quarantined" lines
+        """
+        counts = {"games": 0, "duplicates": 0, "quarantined": 0}
+        with FileLock(MATCH_HISTORY_LOCK_FILE):
+            if not os.path.exists(MATCH_HISTORY_FILE):
+                return counts
+            
+            rejected = []
+            seen = set()  # digests of every game written
+            previous = None
+            temp_path = temp_path_for(MATCH_HISTORY_FILE)
+            with open(MATCH_HISTORY_FILE, newline="", encoding=MATCH_HISTORY_ENCODING,
+                      errors=MATCH_HISTORY_ERRORS) as src, \
+                 open(temp_path, "w", newline="", encoding=MATCH_HISTORY_ENCODING) as dst:
+                dst.write(MatchStorage._format_version())
+                values = MatchStorage._iter_values(src, rejected=rejected)
+                for rows in MatchStorage._iter_games(values):
+                    # Legacy saves in the same second merged into one game
+                    unique = MatchStorage._without_repeats(rows)
+                    digest = hashlib.blake2b(repr(unique).encode("utf-8"), 
+                                             digest_size=16).digest()
+                    copies = len(rows) // len(unique)
+                    if digest in seen or MatchStorage._is_resave(previous, unique):
+                        counts["duplicates"] += copies
+                        continue
+                    counts["duplicates"] += copies - 1
+                    seen.add(digest)
+                    previous = unique
+                    dst.write(MatchStorage._format_games([unique]))
+                    counts["games"] += 1
+                dst.flush()
+                os.fsync(dst.fileno())
+            
+            # Keep the bad lines before they leave the history file
+            if rejected:
+                with open(MATCH_QUARANTINE_FILE, "a", newline="", 
+                          encoding=MATCH_HISTORY_ENCODING) as f:
+                    csv.writer(f).writerows(rejected)
+                    f.flush()
+                    os.fsync(f.fileno())
+            counts["quarantined"] = len(rejected)
+            
+            os.replace(temp_path, MATCH_HISTORY_FILE)
+            MatchStorage._forget_derived_data()
+        return counts
+    
+    @staticmethod
+    def _without_repeats(rows: List[Tuple[str, ...]]) -> List[Tuple[str, ...]]:
+        """A game's rows with any whole repeats of its player list removed"""
+        for size in range(1, len(rows) // 2 + 1):
+            if len(rows) % size == 0 and rows[:size] * (len(rows) // size) == rows:
+                return rows[:size]
+        return rows
+    
+    @staticmethod
+    def _is_resave(previous: Optional[List[Tuple[str, ...]]], 
+                   rows: List[Tuple[str, ...]]) -> bool:
+        """Check whether a game is the previous one saved again moments later"""
+        if previous is None or [r[1:] for r in previous] != [r[1:] for r in rows]:
+            return False
+        first = MatchStorage._game_time(previous[0][0])
+        second = MatchStorage._game_time(rows[0][0])
+        return (first is not None and second is not None 
+                and 0 <= second - first <= MatchStorage.DUPLICATE_SAVE_SECONDS)
+    
+    @staticmethod
+    def archive_history(keep_games: int = 1000, segment_games: int = 10000) -> int:
+        """
+        Move the oldest games into compressed archive segments of
+        segment_games games each, keeping at least keep_games in the file
+        Returns: number of games archived
+        """
+        with FileLock(MATCH_HISTORY_LOCK_FILE):
+            if not os.path.exists(MATCH_HISTORY_FILE):
+                return 0
+            
+            game_ids = []
+            with open(MATCH_HISTORY_FILE, newline="", encoding=MATCH_HISTORY_ENCODING,
+                      errors=MATCH_HISTORY_ERRORS) as f:
+                for rows in MatchStorage._iter_games(MatchStorage._iter_values(f)):
+                    game_ids.append(rows[0][0])
+            
+            # An interrupted earlier run may have archived games it didn't get
+            # to remove: the file then still starts with a segment's first game
+            skip = 0
+            summaries = [_archive.read_summary(segment) for segment in _archive.segments()]
+            if (game_ids and summaries 
+                    and game_ids[0] in {summary["first_game"] for summary in summaries}
+                    and summaries[-1]["last_game"] in game_ids):
+                skip = game_ids.index(summaries[-1]["last_game"]) + 1
+            segments_due = max(0, len(game_ids) - skip - keep_games) // segment_games
+            if not skip and not segments_due:
+                return 0
+            
+            # Stream the file once: whole segments out, the rest into the new file
+            temp_path = temp_path_for(MATCH_HISTORY_FILE)
+            with open(MATCH_HISTORY_FILE, newline="", encoding=MATCH_HISTORY_ENCODING,
+                      errors=MATCH_HISTORY_ERRORS) as src, \
+                 open(temp_path, "w", newline="", encoding=MATCH_HISTORY_ENCODING) as dst:
+                dst.write(MatchStorage._format_version())
+                games = MatchStorage._iter_games(MatchStorage._iter_values(src))
+                for _ in range(skip):
+                    next(games)
+                for _ in range(segments_due):
+                    chunk = [next(games) for _ in range(segment_games)]
+                    MatchStorage._write_segment(
+                        MatchStorage._format_version() + MatchStorage._format_games(chunk)
+                    )
+                for rows in games:
+                    dst.write(MatchStorage._format_games([rows]))
+                dst.flush()
+                os.fsync(dst.fileno())
+            
+            os.replace(temp_path, MATCH_HISTORY_FILE)
+            MatchStorage._forget_derived_data()
+        return segments_due * segment_games
+    
+    @staticmethod
+    def _write_segment(records: str, path: Optional[str] = None):
+        """Write history records as an archive segment, new or replacing path"""
+        values = list(MatchStorage._iter_values(io.StringIO(records, newline="")))
+        summary = MatchStorage._summarise(values)
+        data = records.encode(MATCH_HISTORY_ENCODING)
+        if path is None:
+            _archive.add_segment(data, summary)
+        else:
+            _archive.write_segment(path, data, summary)
+    
+    @staticmethod
+    def _summarise(values: List[Tuple[str, ...]]) -> Dict:
+        """The summary stored with an archive segment, used to skip it in queries"""
+        times = [t for t in map(MatchStorage._game_time, {v[0] for v in values}) 
+                 if t is not None]
+        return {
+            "version": MatchStorage.SEGMENT_SUMMARY_VERSION,
+            "games": sum(1 for _ in MatchStorage._iter_games(values)),
+            "rows": len(values),
+            "first_game": values[0][0] if values else None,
+            "last_game": values[-1][0] if values else None,
+            "since": min(times, default=None),
+            "until": max(times, default=None),
+            "scripts": sorted({v[3] for v in values}),
+            "storytellers": sorted({v[2] for v in values}),
+            "usernames": BloomFilter.of(v[5] for v in values).to_dict(),
+        }
+    
+    @staticmethod
+    def _segment_may_match(summary: Dict, criteria: Dict[str, str], 
+                           since: Optional[int], until: Optional[int]) -> bool:
+        """Check whether a segment's summary allows any row to match a query"""
+        if summary.get("version") != MatchStorage.SEGMENT_SUMMARY_VERSION:
+            return True
+        if "script" in criteria and criteria["script"] not in summary["scripts"]:
+            return False
+        if ("storyteller" in criteria 
+                and criteria["storyteller"] not in summary["storytellers"]):
+            return False
+        if ("username" in criteria and criteria["username"] 
+                not in BloomFilter.from_dict(summary["usernames"])):
+            return False
+        if since is not None and summary["until"] is not None and summary["until"] < since:
+            return False
+        if until is not None and summary["since"] is not None and summary["since"] > until:
+            return False
+        return True
+    
+    @staticmethod
+    def _iter_segment_values(segment: str) -> Iterator[Tuple[str, ...]]:
+        """Parse an archive segment into tuples of values in COLUMNS order"""
+        text = _archive.read_records(segment).decode(MATCH_HISTORY_ENCODING)
+        return MatchStorage._iter_values(io.StringIO(text, newline=""))
+    
+    @staticmethod
+    def _iter_archived_values() -> Iterator[Tuple[str, ...]]:
+        """Every archived row, oldest first"""
+        for segment in _archive.segments():
+            yield from MatchStorage._iter_segment_values(segment)
+    
+    @staticmethod
+    def _iter_games(values: Iterable[Tuple[str, ...]]) -> Iterator[List[Tuple[str, ...]]]:
+        """Group rows into games: runs with the same header, as in MatchTable"""
+        rows = []
+        for row in values:
+            if rows and row[:len(GAME_COLUMNS)] != rows[0][:len(GAME_COLUMNS)]:
+                yield rows
+                rows = []
+            rows.append(row)
+        if rows:
+            yield rows
+    
+    @staticmethod
+    def _committed_size() -> int:
+        """
+        Size of the history file without any game another process is
+        still writing; rows past it aren't read until the next refresh
+        """
+        with FileLock(MATCH_HISTORY_LOCK_FILE):
+            try:
+                return os.path.getsize(MATCH_HISTORY_FILE)
+            except FileNotFoundError:
+                return 0
+    
+    @staticmethod
+    def _forget_derived_data():
+        """
+        Drop the cache and stats index after rewriting the history file
+        A rewrite can leave the file's tail unchanged, so the usual
+        rewrite detection isn't enough
+        """
+        global _stats_index
+        _history_cache.invalidate()
+        if os.path.exists(TABLE_SNAPSHOT_FILE):
+            os.remove(TABLE_SNAPSHOT_FILE)
+        with _stats_lock:
+            _stats_index = StatsIndex()
+            if os.path.exists(STATS_INDEX_FILE):
+                os.remove(STATS_INDEX_FILE)
+    
+    @staticmethod
+    def load_matches(workers: int = 1) -> List[Dict]:
+        """Load all matches from the CSV file (see load_table for workers)"""
+        return list(MatchStorage.load_table(workers).iter_rows())
+    
+    @staticmethod
+    def load_table(workers: int = 1) -> MatchTable:
+        """
+        Load all matches as a shared columnar MatchTable
+        The table is owned by the cache and must not be modified
+        With workers > 1, a large unparsed part of the file is split between
+        that many processes (e.g. os.cpu_count())
+        """
+        with _cache_lock:
+            if not os.path.exists(MATCH_HISTORY_FILE):
+                _history_cache.clear()
+                return _history_cache.table
+            
+            # Only rows appended since the last call (or the snapshot) are parsed
+            _history_cache.load_snapshot(MATCH_HISTORY_FILE, TABLE_SNAPSHOT_FILE)
+            _history_cache.refresh(MATCH_HISTORY_FILE, workers=workers)
+            _history_cache.save_snapshot(TABLE_SNAPSHOT_FILE)
+            return _history_cache.table
+    
+    @staticmethod
+    def iter_matches(username: Optional[str] = None, script: Optional[str] = None,
+                     storyteller: Optional[str] = None, since: Optional[int] = None,
+                     until: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Lazily yield matches that pass all the given filters
+        since/until are inclusive Unix timestamps compared with the game ID
+        """
+        if not os.path.exists(MATCH_HISTORY_FILE):
+            return
+        
+        criteria = {"username": username, "script": script, "storyteller": storyteller}
+        criteria = {k: v for k, v in criteria.items() if v is not None}
+        
+        # Reuse the cached table if it's already loaded, otherwise stream the file
+        with _cache_lock:
+            table = (MatchStorage.load_table() 
+                     if _history_cache.is_warm(MATCH_HISTORY_FILE) else None)
+        if table is not None:
+            for index in table.filter(**criteria):
+                if MatchStorage._in_time_range(
+                        table.value("game_id", index), since, until):
+                    yield table.row(index)
+            return
+        
+        # Strings that must appear verbatim in a matching player line (quoted
+        # values may not). Game fields are only on the game header line
+        needles = [v for k, v in criteria.items() 
+                   if k not in GAME_COLUMNS and '"' not in v]
+        checks = [(COLUMNS.index(k), v) for k, v in criteria.items()]
+        
+        # Archived games first, skipping segments whose summary rules them out
+        for segment in _archive.segments():
+            if MatchStorage._segment_may_match(_archive.read_summary(segment), 
+                                               criteria, since, until):
+                text = _archive.read_records(segment).decode(MATCH_HISTORY_ENCODING)
+                yield from MatchStorage._filter_lines(io.StringIO(text, newline=""), 
+                                                      needles, checks, since, until)
+        
+        with open(MATCH_HISTORY_FILE, newline="", 
+                  encoding=MATCH_HISTORY_ENCODING, errors=MATCH_HISTORY_ERRORS) as f:
+            yield from MatchStorage._filter_lines(f, needles, checks, since, until)
+    
+    @staticmethod
+    def _filter_lines(lines: Iterable[str], needles: List[str], 
+                      checks: List[Tuple[int, str]], since: Optional[int],
+                      until: Optional[int]) -> Iterator[Dict]:
+        """Parse history lines and yield the matches that pass every check"""
+        if needles:
+            lines = (line for line in lines 
+                     if line.startswith("G,") or all(n in line for n in needles))
+        
+        for values in MatchStorage._iter_values(lines):
+            # Check fields on the raw tuple before building a dict
+            if any(values[i] != v for i, v in checks):
+                continue
+            if not MatchStorage._in_time_range(values[0], since, until):
+                continue
+            yield dict(zip(COLUMNS, values))
+    
+    @staticmethod
+    def load_stats() -> StatsIndex:
+        """
+        Get the shared stats index, caught up with the history file
+        It is read from its sidecar file and only rebuilt if that is unusable
+        """
+        global _stats_index
+        # Taken before _stats_lock: rewrites hold the file lock while they
+        # take _stats_lock, so the opposite order could deadlock
+        stop = MatchStorage._committed_size()
+        with _stats_lock:
+            if _stats_index is None:
+                _stats_index = StatsIndex.load(STATS_INDEX_FILE) or StatsIndex()
+            stale = (os.path.exists(MATCH_HISTORY_FILE) and not (
+                _stats_index.source 
+                and _ParsePosition.from_dict(_stats_index.source).can_continue(
+                    MATCH_HISTORY_FILE)))
+        
+        # A rebuild counts the cached table rather than parsing the file
+        # again. Not under _stats_lock, as the cache lock can wait on the
+        # file lock (see _cache_lock)
+        counted = MatchStorage._count_cached_table() if stale else None
+        with _stats_lock:
+            _stats_index = MatchStorage._refresh_stats(_stats_index, stop, counted)
+            return _stats_index
+    
+    @staticmethod
+    def _count_cached_table() -> Optional[StatsIndex]:
+        """Stats counted from the cached table, or None if it isn't loaded"""
+        with _cache_lock:
+            if not _history_cache.is_warm(MATCH_HISTORY_FILE):
+                return None
+            # The table is only ever appended to, so these rows stay put
+            table = _history_cache.table
+            rows = len(table)
+            source = _history_cache.position.to_dict()
+        index = StatsIndex()
+        index.add_table(table, rows)
+        index.source = source
+        return index
+    
+    @staticmethod
+    def _record_stats(rows: List[Tuple[str, ...]], start: int, data: bytes):
+        """Count a just-saved game in the stats index and persist it"""
+        global _stats_index
+        with _stats_lock:
+            if _stats_index is None:
+                _stats_index = StatsIndex.load(STATS_INDEX_FILE) or StatsIndex()
+            
+            position = (_ParsePosition.from_dict(_stats_index.source) 
+                        if _stats_index.source else _ParsePosition())
+            if position.advance(start, data):
+                _stats_index.add_rows(rows)
+                _stats_index.source = position.to_dict()
+                MatchStorage._save_stats(_stats_index)
+            else:
+                # The index is behind the file, so catch up on everything up
+                # to this game, which was committed under the file lock
+                _stats_index = MatchStorage._refresh_stats(_stats_index, start + len(data))
+    
+    @staticmethod
+    def _refresh_stats(index: StatsIndex, stop: int, 
+                       counted: Optional[StatsIndex] = None) -> StatsIndex:
+        """
+        Count rows appended since the index was last updated, up to stop
+        (the committed size of the file, see _committed_size)
+        counted, if given, is the start of the history already counted
+        (see _count_cached_table), used instead of rebuilding from scratch
+        """
+        if not os.path.exists(MATCH_HISTORY_FILE):
+            return index if not index.source else StatsIndex()
+        
+        if not index.source and counted is not None:
+            index = MatchStorage._refresh_stats(counted, stop)
+            MatchStorage._save_stats(index)
+            return index
+        
+        position = (_ParsePosition.from_dict(index.source) if index.source 
+                    else _ParsePosition())
+        if position.is_current(MATCH_HISTORY_FILE):
+            return index
+        
+        offset = position.offset
+        rows = position.read_appended(MATCH_HISTORY_FILE, stop=stop)
+        if rows is None and counted is not None:
+            return MatchStorage._refresh_stats(StatsIndex(), stop, counted)
+        if rows is None:
+            # Truncated or rewritten: rebuild from scratch
+            index = StatsIndex()
+            position = _ParsePosition()
+            offset = 0
+            rows = position.read_appended(MATCH_HISTORY_FILE, stop=stop)
+        
+        if not index.source:
+            # Counting from scratch, so archived games first
+            index.add_rows(MatchStorage._iter_archived_values())
+        index.add_rows(rows)
+        if position.offset != offset or not index.source:
+            index.source = position.to_dict()
+            MatchStorage._save_stats(index)
+        return index
+    
+    @staticmethod
+    def _save_stats(index: StatsIndex):
+        """
+        Write the stats sidecar, at most every STATS_SAVE_INTERVAL seconds
+        A stale sidecar only means re-reading a few rows on the next start
+        """
+        global _stats_saved_at
+        now = time.monotonic()
+        if now - _stats_saved_at >= MatchStorage.STATS_SAVE_INTERVAL:
+            index.save(STATS_INDEX_FILE)
+            _stats_saved_at = now
+    
+    @staticmethod
+    def iter_load(chunk_bytes: int = 1 << 20) -> Iterator[Tuple[int, int]]:
+        """
+        Load the history into the cache a chunk at a time
+        Yields (bytes loaded, total bytes) after each chunk or archive segment
+        """
+        # The cache lock is only held a step at a time, never across a yield
+        with _cache_lock:
+            if not os.path.exists(MATCH_HISTORY_FILE):
+                _history_cache.clear()
+                return
+            _history_cache.load_snapshot(MATCH_HISTORY_FILE, TABLE_SNAPSHOT_FILE)
+            loading_archive = not _history_cache.archive_loaded
+        
+        archived = 0
+        if loading_archive:
+            archived = _archive.total_size()
+            total = archived + os.path.getsize(MATCH_HISTORY_FILE)
+            for loaded in _history_cache.load_archive():
+                yield loaded, total
+        
+        while True:
+            with _cache_lock:
+                _history_cache.refresh(MATCH_HISTORY_FILE, chunk_bytes)
+                position = _history_cache.position
+                done = position.offset
+                current = position.is_current(MATCH_HISTORY_FILE)
+            total = max(done, os.path.getsize(MATCH_HISTORY_FILE))
+            yield archived + done, archived + total
+            if current:
+                break
+        with _cache_lock:
+            _history_cache.save_snapshot(TABLE_SNAPSHOT_FILE)
+    
+    @staticmethod
+    def get_game(game_id: str) -> Optional[Dict]:
+        """
+        Get one game (see _game_record) by seeking straight to it
+        Returns None if there is no such game
+        """
+        if not os.path.exists(MATCH_HISTORY_FILE):
+            return None
+        
+        # Keeps the game offsets current; only appended rows are parsed
+        with _cache_lock:
+            table = MatchStorage.load_table()
+            offset = _history_cache.game_offsets.get(game_id)
+        if offset is None:
+            # Legacy games have no header to seek to
+            game = table.find_game(game_id)
+            return None if game is None else table.game_record(game)
+        
+        # The header, then its player records
+        with open(MATCH_HISTORY_FILE, "rb") as f:
+            f.seek(offset)
+            lines = [f.readline()]
+            for line in f:
+                if not line.startswith(b"P,"):
+                    break
+                lines.append(line)
+        
+        text = b"".join(lines).decode(MATCH_HISTORY_ENCODING, MATCH_HISTORY_ERRORS)
+        rows = [values for values in MatchStorage._iter_values(io.StringIO(text, newline=""))
+                if values[0] == game_id]
+        return MatchStorage._game_record(rows) if rows else None
+    
+    @staticmethod
+    def _game_record(rows: List[Tuple[str, ...]]) -> Dict:
+        """Build the record of one game from its rows' values"""
+        game = dict(zip(GAME_COLUMNS, rows[0][:len(GAME_COLUMNS)])) if rows else {}
+        game["rows"] = [dict(zip(COLUMNS, values)) for values in rows]
+        return game
+    
+    @staticmethod
+    def _in_time_range(game_id: str, since: Optional[int], 
+                       until: Optional[int]) -> bool:
+        """Check a game ID's timestamp against an inclusive time range"""
+        if since is None and until is None:
+            return True
+        timestamp = MatchStorage._game_time(game_id)
+        if timestamp is None:
+            return False
+        return ((since is None or timestamp >= since) 
+                and (until is None or timestamp <= until))
+    
+    @staticmethod
+    def _game_time(game_id: str) -> Optional[int]:
+        """The Unix time a game was saved, from its ID, or None if it has none"""
+        try:
+            # Games saved in the same second have a "-sequence" suffix
+            return int(game_id.split("-", 1)[0])
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def _parse_data(data: bytes, game: Optional[Tuple[str, ...]] = None
+                    ) -> Iterator[Tuple[str, ...]]:
+        """Parse whole lines of the history file (see _iter_values)"""
+        text = data.decode(MATCH_HISTORY_ENCODING, MATCH_HISTORY_ERRORS)
+        return MatchStorage._iter_values(io.StringIO(text, newline=""), game)
+    
+    @staticmethod
+    def _parse_table(data: bytes, game: Optional[Tuple[str, ...]] = None) -> MatchTable:
+        """Parse whole lines of the history file into a MatchTable (runs in workers)"""
+        table = MatchTable()
+        table.extend_values(MatchStorage._parse_data(data, game))
+        return table
+    
+    @staticmethod
+    def _parse_parallel(data: bytes, game: Optional[Tuple[str, ...]], 
+                        workers: int) -> Iterator[MatchTable]:
+        """Parse whole lines of the history file in worker processes, in order"""
+        bounds = MatchStorage._split_lines(data, workers * 2)
+        chunks = [data[start:end] for start, end in zip(bounds, bounds[1:])]
+        # Only the first chunk can start with another chunk's game's players
+        games = [game] + [None] * (len(chunks) - 1)
+        with ProcessPoolExecutor(workers) as pool:
+            yield from pool.map(MatchStorage._parse_table, chunks, games)
+    
+    @staticmethod
+    def _split_lines(data: bytes, parts: int) -> List[int]:
+        """
+        Offsets splitting whole lines into about parts equal ranges, each
+        starting with a line that doesn't need an earlier game header
+        """
+        bounds = [0]
+        for part in range(1, parts):
+            start = max(bounds[-1], len(data) * part // parts)
+            start = data.find(b"\n", start) + 1 or len(data)
+            while data.startswith(b"P,", start):
+                start = data.find(b"\n", start) + 1 or len(data)
+            bounds.append(start)
+        bounds.append(len(data))
+        return sorted(set(bounds))
+    
+    @staticmethod
+    def _iter_values(f, game: Optional[Tuple[str, ...]] = None,
+                     rejected: Optional[List[List[str]]] = None) -> Iterator[Tuple[str, ...]]:
+        """
+        Parse CSV lines in either format into tuples of values in COLUMNS order
+        game is the header for player records before the first game header
+        Malformed rows are skipped, and added to rejected if it is given
+        """
+        reject = rejected.append if rejected is not None else lambda row: None
+        reader = csv.reader(f)
+        for row in reader:
+            if not row:
+                continue
+            
+            kind = row[0]
+            if kind == "P":
+                if game is not None and len(row) >= 5:
+                    yield game + (row[1], row[2], row[3], row[4])
                 else:
-                    result = "Win" if MatchStorage._is_player_winner(row[1], winner) else "Loss"
-                
-                matches.append({
-                    "game_id": game_id,
-                    "winner": winner,
-                    "storyteller": storyteller,
-                    "script": script,
-                    "class": row[1],
-                    "username": row[2],
-                    "role": row[3],
-                    "result": result
-                })
-        
-        return matches
+                    reject(row)
+                continue
+            if kind == "G":
+                game = tuple(row[1:5]) if len(row) >= 5 else None
+                if game is None:
+                    reject(row)
+                continue
+            if kind == "V":
+                continue
+            
+            # Legacy row
+            if len(row) < 4:
+                reject(row)
+                continue
+            
+            match_id = row[0]
+            parts = match_id.split("|")
+            
+            if len(parts) != 4:
+                reject(row)
+                continue
+            
+            game_id, winner, storyteller, script = parts
+            
+            # Handle old format without result field
+            if len(row) >= 5:
+                result = row[4]
+            else:
+                result = "Win" if MatchStorage._is_player_winner(row[1], winner) else "Loss"
+            
+            yield (game_id, winner, storyteller, script, 
+                   row[1], row[2], row[3], result)
+    
+    @staticmethod
+    def _new_game_id(latest: Optional[str] = None) -> str:
+        """
+        Get a unique, increasing game ID: the save time in seconds, with
+        "-1", "-2", ... added for further games in the same second
+        latest is the newest ID already saved, by any process
+        """
+        global _last_game_id
+        with _game_id_lock:
+            second, sequence = int(time.time()), 0
+            last_second, last_sequence = _last_game_id
+            if latest:
+                parts = latest.split("-", 1)
+                try:
+                    saved = (int(parts[0]), int(parts[1]) if len(parts) > 1 else 0)
+                except ValueError:
+                    saved = (0, 0)
+                last_second, last_sequence = max((last_second, last_sequence), saved)
+            if second <= last_second:
+                # Same second, or the clock went back
+                second, sequence = last_second, last_sequence + 1
+            _last_game_id = (second, sequence)
+        return f"{second}-{sequence}" if sequence else str(second)
+    
+    @staticmethod
+    def _index_games(data: bytes, base: int, game_offsets: Dict[str, int]):
+        """
+        Record where each game header in whole lines of the file begins
+        Legacy rows aren't indexed; get_game finds those in the table
+        """
+        start = 0 if data.startswith(b"G,") else data.find(b"\nG,") + 1
+        while data.startswith(b"G,", start):
+            end = data.find(b"\n", start)
+            game_id = data[start + 2:end].split(b",", 1)[0].strip(b'"')
+            game_id = game_id.decode(MATCH_HISTORY_ENCODING, MATCH_HISTORY_ERRORS)
+            game_offsets.setdefault(game_id, base + start)
+            start = data.find(b"\nG,", end) + 1 or len(data)
+    
+    @staticmethod
+    def _format_version() -> str:
+        """The record that starts a history file"""
+        return f"V,{MatchStorage.FORMAT_VERSION}\r\n"
+    
+    @staticmethod
+    def _format_games(games: Iterable[Sequence[Tuple[str, ...]]]) -> str:
+        """Format games, each given as its rows' values, as header and player records"""
+        buffer = io.StringIO(newline="")
+        writer = csv.writer(buffer)
+        for rows in games:
+            writer.writerow(("G",) + tuple(rows[0][:len(GAME_COLUMNS)]))
+            writer.writerows(("P",) + tuple(values[len(GAME_COLUMNS):]) 
+                             for values in rows)
+        return buffer.getvalue()
+    
+    @staticmethod
+    def _last_game_header(data: bytes) -> Optional[Tuple[str, ...]]:
+        """The values of the last game header in whole lines of the file"""
+        start = data.rfind(b"\nG,") + 1
+        if not data.startswith(b"G,", start):
+            return None
+        end = data.find(b"\n", start)
+        line = data[start:end if end >= 0 else len(data)]
+        line = line.decode(MATCH_HISTORY_ENCODING, MATCH_HISTORY_ERRORS)
+        row = next(csv.reader([line.rstrip("\r\n")]), [])
+        return tuple(row[1:5]) if len(row) >= 5 else None
     
     @staticmethod
     def _is_player_winner(player_class: str, winning_team: str) -> bool:
@@ -83,5 +1175,4 @@ class MatchStorage:
     @staticmethod
     def get_all_usernames() -> set:
         """Get all unique usernames from match history"""
-        matches = MatchStorage.load_matches()
-        return {m["username"] for m in matches}
\ No newline at end of file
+        return set(MatchStorage.load_table().pools["username"].strings)
\ No newline at end of file
@@ -0,0 +1,256 @@
+import marshal
+import os
+import sys
+from array import array
+from bisect import bisect_right
+from itertools import compress
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from services.file_lock import temp_path_for
+
+COLUMNS = ("game_id", "winner", "storyteller", "script",
+           "class", "username", "role", "result")
+
+# Fields shared by every row of one game
+GAME_COLUMNS = COLUMNS[:4]
+
+class StringPool:
+    """Maps strings to compact integer IDs and back"""
+    
+    def __init__(self):
+        self.strings: List[str] = []
+        self.ids: Dict[str, int] = {}
+    
+    def intern(self, value: str) -> int:
+        """Get the ID for a string, adding it if needed"""
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[value] = string_id
+            self.strings.append(value)
+        return string_id
+    
+    def get_id(self, value: str) -> Optional[int]:
+        """Get the ID for a string, or None if it was never seen"""
+        return self.ids.get(value)
+    
+    def __getitem__(self, string_id: int) -> str:
+        return self.strings[string_id]
+    
+    def __len__(self) -> int:
+        return len(self.strings)
+
+class MatchTable:
+    """
+    Columnar match rows: one array of string IDs per field
+    Each field has its own StringPool to map IDs back to strings
+    A game is a run of consecutive rows with the same GAME_COLUMNS values
+    """
+    
+    SNAPSHOT_VERSION = 2
+    
+    def __init__(self):
+        self.pools: Dict[str, StringPool] = {c: StringPool() for c in COLUMNS}
+        self.columns: Dict[str, array] = {c: array("I") for c in COLUMNS}
+        self.game_starts = array("I")  # index of each game's first row
+        self.game_numbers: Dict[int, int] = {}  # game_id string ID -> first game with it
+    
+    def __len__(self) -> int:
+        return len(self.columns["game_id"])
+    
+    def append_values(self, values: Sequence[str]):
+        """Append one row given as values in COLUMNS order"""
+        ids = [self.pools[c].intern(v) for c, v in zip(COLUMNS, values)]
+        
+        last = len(self) - 1
+        if last < 0 or any(self.columns[c][last] != ids[i] 
+                           for i, c in enumerate(GAME_COLUMNS)):
+            self.game_numbers.setdefault(ids[0], len(self.game_starts))
+            self.game_starts.append(last + 1)
+        
+        for column, string_id in zip(COLUMNS, ids):
+            self.columns[column].append(string_id)
+    
+    def extend_values(self, rows: Iterable[Sequence[str]]):
+        """Append many rows given as values in COLUMNS order"""
+        for values in rows:
+            self.append_values(values)
+    
+    def extend_table(self, other: "MatchTable"):
+        """Append every row of another table, e.g. one built in another process"""
+        if not len(other):
+            return
+        # Map the other table's string IDs to this table's
+        remap = {c: [self.pools[c].intern(v) for v in other.pools[c].strings] 
+                 for c in COLUMNS}
+        
+        base, base_game = len(self), len(self.game_starts)
+        # Its first rows may continue this table's last game
+        skip = 1 if base and all(self.columns[c][base - 1] == remap[c][other.columns[c][0]]
+                                 for c in GAME_COLUMNS) else 0
+        for column in COLUMNS:
+            self.columns[column].extend(map(remap[column].__getitem__, 
+                                            other.columns[column]))
+        self.game_starts.extend(start + base for start in other.game_starts[skip:])
+        for string_id, game in other.game_numbers.items():
+            if game >= skip:
+                self.game_numbers.setdefault(remap["game_id"][string_id], 
+                                             base_game + game - skip)
+    
+    def append(self, row: Dict):
+        """Append one row in the load_matches dict format"""
+        self.append_values([row[c] for c in COLUMNS])
+    
+    def game_count(self) -> int:
+        """Number of games in the table"""
+        return len(self.game_starts)
+    
+    def game_span(self, game: int) -> Tuple[int, int]:
+        """(first row, end row) of a game, numbered from 0 in file order"""
+        start = self.game_starts[game]
+        end = (self.game_starts[game + 1] if game + 1 < len(self.game_starts) 
+               else len(self))
+        return start, end
+    
+    def game_record(self, game: int) -> Dict:
+        """
+        A game's fields plus its rows in the load_matches format under
+        "rows", as returned by save_match
+        """
+        start, end = self.game_span(game)
+        rows = list(self.iter_rows(range(start, end)))
+        record = {c: rows[0][c] for c in GAME_COLUMNS}
+        record["rows"] = rows
+        return record
+    
+    def find_game(self, game_id: str) -> Optional[int]:
+        """Number of the game with this ID, or None if there isn't one"""
+        string_id = self.pools["game_id"].get_id(game_id)
+        return None if string_id is None else self.game_numbers.get(string_id)
+    
+    def game_of_row(self, index: int) -> int:
+        """Number of the game a row belongs to"""
+        return bisect_right(self.game_starts, index) - 1
+    
+    def value(self, column: str, index: int) -> str:
+        """Get a single field of a row"""
+        return self.pools[column][self.columns[column][index]]
+    
+    def row(self, index: int) -> Dict:
+        """Get a row in the load_matches dict format"""
+        return {c: self.pools[c][self.columns[c][index]] for c in COLUMNS}
+    
+    def iter_rows(self, indices: Optional[Iterable[int]] = None) -> Iterator[Dict]:
+        """Iterate rows as dicts, optionally only the given indices"""
+        if indices is None:
+            indices = range(len(self))
+        for index in indices:
+            yield self.row(index)
+    
+    def filter(self, indices: Optional[Iterable[int]] = None, 
+               **criteria: str) -> List[int]:
+        """
+        Get the indices of rows whose fields equal the given values
+        e.g. table.filter(username="Kael", script="Trouble Brewing")
+        """
+        if indices is None:
+            indices = range(len(self))
+        
+        for column, value in criteria.items():
+            # Keywords can't be "class", so accept "class_" too
+            column = column.rstrip("_")
+            string_id = self.pools[column].get_id(value)
+            if string_id is None:
+                return []
+            
+            ids = self.columns[column]
+            if isinstance(indices, range):
+                indices = list(compress(indices, map(string_id.__eq__, ids)))
+            else:
+                indices = [i for i in indices if ids[i] == string_id]
+        
+        return list(indices)
+    
+    def group_by(self, column: str, 
+                 indices: Optional[Iterable[int]] = None) -> Dict[str, List[int]]:
+        """Group row indices by the value of a field"""
+        if indices is None:
+            indices = range(len(self))
+        
+        ids = self.columns[column]
+        grouped: Dict[int, List[int]] = {}
+        for index in indices:
+            grouped.setdefault(ids[index], []).append(index)
+        
+        pool = self.pools[column]
+        return {pool[string_id]: rows for string_id, rows in grouped.items()}
+    
+    def win_stats(self, column: str, 
+                  indices: Optional[Iterable[int]] = None) -> Dict[str, Tuple[int, int]]:
+        """Count (wins, total) per value of a field"""
+        if indices is None:
+            indices = range(len(self))
+        
+        ids = self.columns[column]
+        results = self.columns["result"]
+        win_id = self.pools["result"].get_id("Win")
+        
+        counts: Dict[int, List[int]] = {}
+        for index in indices:
+            stats = counts.get(ids[index])
+            if stats is None:
+                stats = counts[ids[index]] = [0, 0]
+            stats[1] += 1
+            if results[index] == win_id:
+                stats[0] += 1
+        
+        pool = self.pools[column]
+        return {pool[string_id]: (wins, total) 
+                for string_id, (wins, total) in counts.items()}
+    
+    def save(self, path: str, source: Dict):
+        """
+        Write the table to a binary snapshot file, atomically
+        source records what part of the history it covers (owned by the storage)
+        """
+        data = marshal.dumps({
+            "version": self.SNAPSHOT_VERSION,
+            "layout": (array("I").itemsize, sys.byteorder),
+            "source": source,
+            "pools": {c: self.pools[c].strings for c in COLUMNS},
+            "columns": {c: self.columns[c].tobytes() for c in COLUMNS},
+            "game_starts": self.game_starts.tobytes(),
+        })
+        
+        temp_path = temp_path_for(path)
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    
+    @staticmethod
+    def load(path: str) -> Optional[Tuple["MatchTable", Dict]]:
+        """
+        Read a snapshot written by save as (table, source), or None if it
+        is missing, unusable or was written on a different platform
+        """
+        try:
+            with open(path, "rb") as f:
+                data = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        
+        if (not isinstance(data, dict) 
+                or data.get("version") != MatchTable.SNAPSHOT_VERSION
+                or data.get("layout") != (array("I").itemsize, sys.byteorder)):
+            return None
+        
+        table = MatchTable()
+        for column in COLUMNS:
+            pool = table.pools[column]
+            pool.strings = data["pools"][column]
+            pool.ids = {value: i for i, value in enumerate(pool.strings)}
+            table.columns[column].frombytes(data["columns"][column])
+        table.game_starts.frombytes(data["game_starts"])
+        game_ids = table.columns["game_id"]
+        for game, start in enumerate(table.game_starts):
+            table.game_numbers.setdefault(game_ids[start], game)
+        return table, data["source"]
\ No newline at end of file
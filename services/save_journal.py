@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional
+from config.constants import MATCH_HISTORY_FILE, SAVE_JOURNAL_DIR
+from models.player import Player
+from services.file_lock import FileLock, temp_path_for
+from utils.helpers import local_data_dir
+
+class SaveJournal:
+    """
+    Matches waiting to be saved, kept in a journal on local disk until they
+    are in the history so a crash or a failed save doesn't lose them
+    Each running instance writes its own journal and holds its lock until
+    it closes; a journal whose lock is free was left by an instance that
+    stopped first, and is adopted by the next one (see adopt_orphans)
+    One JSON object per line; a line cut short by a crash is ignored
+    """
+    
+    SUFFIX = ".jsonl"
+    
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or SaveJournal.directory_for(MATCH_HISTORY_FILE)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.path, self._owner = self._claim_new_journal()
+    
+    @staticmethod
+    def directory_for(history_path: str) -> str:
+        """Local journal directory for a history, so each one has its own"""
+        location = os.path.abspath(history_path)
+        key = hashlib.blake2b(location.encode("utf-8"), digest_size=8).hexdigest()
+        name = f"{os.path.splitext(os.path.basename(location))[0]}-{key}"
+        return local_data_dir(SAVE_JOURNAL_DIR, name)
+    
+    def add(self, players: List[Player], winning_team: str, storyteller: str,
+            script: str) -> Dict:
+        """Record a match before it is queued; returns its entry"""
+        entry = {
+            "id": uuid.uuid4().hex,
+            "players": [{"username": p.username, "role": p.role,
+                         "player_class": p.player_class, "is_traveler": p.is_traveler}
+                        for p in players],
+            "winning_team": winning_team,
+            "storyteller": storyteller,
+            "script": script,
+        }
+        with self._lock:
+            self._append([entry])
+        return entry
+    
+    def remove(self, entry_id: str):
+        """Forget a match once it has been saved"""
+        with self._lock:
+            entries = [e for e in self._read(self.path) if e["id"] != entry_id]
+            if not entries:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+            temp_path = temp_path_for(self.path)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            os.replace(temp_path, self.path)
+    
+    def pending(self) -> List[Dict]:
+        """Every match recorded but not yet saved, oldest first"""
+        with self._lock:
+            return self._read(self.path)
+    
+    def adopt_orphans(self) -> int:
+        """
+        Move the entries of journals left by instances that have stopped
+        into this one, so they are saved once instead of lost
+        Returns: the number of entries adopted
+        """
+        adopted = 0
+        with self._lock:
+            known = {entry["id"] for entry in self._read(self.path)}
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(f"{self.SUFFIX}.lock"):
+                    continue
+                path = os.path.join(self.directory, name[:-len(".lock")])
+                if path == self.path:
+                    continue
+                owner = self._try_lock(f"{path}.lock")
+                if owner is None:
+                    continue  # Its instance is still running
+                try:
+                    entries = [e for e in self._read(path) if e["id"] not in known]
+                    if entries:
+                        self._append(entries)
+                        known.update(entry["id"] for entry in entries)
+                        adopted += len(entries)
+                    # Journal first: a lock file without one is harmless
+                    for leftover in (path, f"{path}.lock"):
+                        try:
+                            os.remove(leftover)
+                        except OSError:
+                            pass
+                finally:
+                    owner.release()
+        return adopted
+    
+    def close(self):
+        """Give up the journal; entries still in it are adopted next time"""
+        with self._lock:
+            if self._owner is None:
+                return
+            if not os.path.exists(self.path):
+                try:
+                    os.remove(f"{self.path}.lock")
+                except OSError:
+                    pass
+            self._owner.release()
+            self._owner = None
+    
+    @staticmethod
+    def players(entry: Dict) -> List[Player]:
+        """The players of an entry, as they were passed to add"""
+        return [Player(**player) for player in entry["players"]]
+    
+    def _claim_new_journal(self):
+        """Create and lock a journal no other instance uses"""
+        while True:
+            path = os.path.join(self.directory,
+                                f"{os.getpid()}-{uuid.uuid4().hex}{self.SUFFIX}")
+            owner = self._try_lock(f"{path}.lock")
+            if owner is not None:
+                return path, owner
+    
+    @staticmethod
+    def _try_lock(lock_path: str) -> Optional[FileLock]:
+        """
+        Take a journal's lock without waiting, or None if it is held
+        Also None if the lock file was removed while we took it: another
+        instance adopted the journal first
+        """
+        lock = FileLock(lock_path)
+        if not lock.acquire(blocking=False):
+            return None
+        try:
+            if os.path.samestat(os.fstat(lock.fileno()), os.stat(lock_path)):
+                return lock
+        except OSError:
+            pass
+        lock.release()
+        return None
+    
+    def _append(self, entries: List[Dict]):
+        data = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries)
+        data = data.encode("utf-8")
+        with open(self.path, "a+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b"\n":
+                    data = b"\n" + data  # End a line cut short by a crash
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    @staticmethod
+    def _read(path: str) -> List[Dict]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
\ No newline at end of file
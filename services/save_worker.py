@@ -0,0 +1,149 @@
+import atexit
+import queue
+import threading
+from typing import Callable, Dict, List, Optional
+from models.player import Player
+from services.save_journal import SaveJournal
+
+class SaveWorker:
+    """
+    Saves matches on a background thread so the UI never waits on disk
+    With a journal, each match is recorded there before it is queued and
+    only forgotten once saved, so failed or interrupted saves can be
+    retried (see submit_pending)
+    """
+    
+    POLL_INTERVAL_MS = 50
+    
+    def __init__(self, root, storage, max_pending: int = 32,
+                 journal: Optional[SaveJournal] = None):
+        self.root = root
+        self.storage = storage
+        self.journal = journal
+        self._queued = set()  # journal entries waiting in the queue
+        self._jobs = queue.Queue(maxsize=max_pending)
+        self._results = queue.Queue()
+        self._pending = 0
+        self._polling = False
+        self._stopped = False
+        
+        self._thread = threading.Thread(target=self._run, name="match-saver", 
+                                        daemon=True)
+        self._thread.start()
+        
+        # Don't lose queued matches if the app exits without calling shutdown
+        atexit.register(self.shutdown)
+    
+    def submit(self, players: List[Player], winning_team: str, storyteller: str,
+               script: str, on_done: Optional[Callable[[Dict], None]] = None,
+               on_error: Optional[Callable[[Exception], None]] = None):
+        """
+        Queue a match to be saved (blocks only if the queue is full)
+        Callbacks are run on the Tk main thread; on_done gets the saved game
+        """
+        if self.journal is None:
+            self.run(self.storage.save_match, 
+                     (list(players), winning_team, storyteller, script),
+                     on_done, on_error)
+            return
+        entry = self.journal.add(players, winning_team, storyteller, script)
+        self._submit_entry(entry, on_done, on_error)
+    
+    def submit_pending(self, on_done: Optional[Callable[[Dict], None]] = None,
+                       on_error: Optional[Callable[[Exception], None]] = None) -> int:
+        """
+        Queue every journaled match that isn't saved or queued: left by a
+        save that failed, or by an instance that stopped before saving it
+        Returns: the number of matches queued
+        """
+        if self.journal is None:
+            return 0
+        self.journal.adopt_orphans()
+        entries = [entry for entry in self.journal.pending() 
+                   if entry["id"] not in self._queued]
+        for entry in entries:
+            self._submit_entry(entry, on_done, on_error)
+        return len(entries)
+    
+    def _submit_entry(self, entry: Dict, on_done: Optional[Callable],
+                      on_error: Optional[Callable[[Exception], None]]):
+        """Queue a journaled match; it stays in the journal if saving fails"""
+        def finished(callback, *args):
+            self._queued.discard(entry["id"])
+            if callback is not None:
+                callback(*args)
+        
+        self._queued.add(entry["id"])
+        self.run(self._save_entry, (entry,), 
+                 lambda game: finished(on_done, game),
+                 lambda e: finished(on_error, e))
+    
+    def _save_entry(self, entry: Dict) -> Dict:
+        """Save a journaled match, then forget it (runs on the worker thread)"""
+        game = self.storage.save_match(
+            SaveJournal.players(entry), entry["winning_team"], 
+            entry["storyteller"], entry["script"]
+        )
+        self.journal.remove(entry["id"])
+        return game
+    
+    def run(self, func: Callable, args: tuple = (), 
+            on_done: Optional[Callable] = None,
+            on_error: Optional[Callable[[Exception], None]] = None):
+        """
+        Queue any other storage write, so it runs in order with the saves
+        on_done gets func's return value on the Tk main thread
+        """
+        if self._stopped:
+            raise RuntimeError("Save worker has been shut down")
+        
+        self._pending += 1
+        self._jobs.put((func, args, on_done, on_error))
+        self._schedule_poll()
+    
+    def shutdown(self, timeout: Optional[float] = None):
+        """Finish all queued saves and stop the thread"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._jobs.put(None)
+        self._thread.join(timeout)
+        if self.journal is not None and not self._thread.is_alive():
+            self.journal.close()
+    
+    def _run(self):
+        """Worker loop: run each queued write in order"""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            
+            func, args, on_done, on_error = job
+            try:
+                result = func(*args)
+            except Exception as e:
+                self._results.put((on_error, (e,)))
+            else:
+                self._results.put((on_done, (result,)))
+    
+    def _schedule_poll(self):
+        """Start polling for finished saves if not already polling"""
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_INTERVAL_MS, self._poll)
+    
+    def _poll(self):
+        """Run callbacks for finished saves on the main thread"""
+        self._polling = False
+        while True:
+            try:
+                callback, args = self._results.get_nowait()
+            except queue.Empty:
+                break
+            
+            self._pending -= 1
+            if callback is not None:
+                callback(*args)
+        
+        if self._pending:
+            self._schedule_poll()
\ No newline at end of file
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import math
+import os
+from fractions import Fraction
+from itertools import permutations
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from config.constants import SETUP_COUNTS_CACHE_DIR
+from models.script import ROLE_CLASSES, Script
+from services.file_lock import temp_path_for
+from services.setup_rules import SETUP_RULES, SetupDraft, SetupRule
+
+class Outcome(NamedTuple):
+    """One branch of setup generation: a bag of roles in play, or the error it hit"""
+    roles: Optional[Tuple[str, ...]]  # sorted; None if generation failed
+    error: Optional[str]
+    ways: int  # the branch has probability 1 / ways
+    
+    @property
+    def probability(self) -> Fraction:
+        return Fraction(1, self.ways)
+
+class _BranchRandom:
+    """
+    Stands in for random.Random while a SetupDraft draws its team, taking
+    the choices listed in path and recording how many there were at each
+    Only the calls the draw phase makes (sample and choice) are supported
+    """
+    
+    def __init__(self, path: List[int], draw_ruled: FrozenSet[str]):
+        self.path = path
+        self.draw_ruled = draw_ruled  # roles with a rule that acts on draw
+        self.widths: List[int] = []
+        self.ways = 1  # every choice is uniform, so a branch is 1 in ways
+    
+    def _branch(self, width: int) -> int:
+        """Index of the path's choice among width equally likely ones"""
+        depth = len(self.widths)
+        if depth == len(self.path):
+            self.path.append(0)
+        self.widths.append(width)
+        self.ways *= width
+        return self.path[depth]
+    
+    def sample(self, population, k: int) -> List[str]:
+        """
+        Every set of k roles is equally likely, as with random.sample
+        Roles with draw rules also branch on their order, since the rules
+        run in draw order and don't always commute
+        """
+        n = len(population)
+        if not 0 <= k <= n:
+            raise ValueError("Sample larger than population or is negative")
+        chosen = _nth_combination(population, k, self._branch(math.comb(n, k)))
+        
+        ruled = [role for role in chosen if role in self.draw_ruled]
+        if len(ruled) > 1:
+            orders = list(permutations(ruled))
+            ruled = list(orders[self._branch(len(orders))])
+            chosen = [role for role in chosen if role not in self.draw_ruled] + ruled
+        return chosen
+    
+    def choice(self, seq):
+        """Every item is equally likely"""
+        if not seq:
+            raise IndexError("Cannot choose from an empty sequence")
+        return seq[self._branch(len(seq))]
+    
+    def next_path(self) -> bool:
+        """Move path to the next unexplored branch; False once all are done"""
+        del self.path[len(self.widths):]
+        while self.path:
+            self.path[-1] += 1
+            if self.path[-1] < self.widths[len(self.path) - 1]:
+                return True
+            self.path.pop()
+        return False
+
+def _draw_ruled_roles() -> FrozenSet[str]:
+    """Roles with a setup rule that acts as soon as they are drawn"""
+    return frozenset(role for role, rules in SETUP_RULES.items()
+                     if any(type(rule).on_draw is not SetupRule.on_draw for rule in rules))
+
+def _nth_combination(population, k: int, index: int) -> List:
+    """The index-th k-combination of population, in itertools.combinations order"""
+    chosen = []
+    n = len(population)
+    for i, item in enumerate(population):
+        if k == 0:
+            break
+        # Combinations that take this item come first
+        taking = math.comb(n - i - 1, k - 1)
+        if index < taking:
+            chosen.append(item)
+            k -= 1
+        else:
+            index -= taking
+    return chosen
+
+class SetupCounts:
+    """Exact counts for one script and resident count"""
+    
+    def __init__(self, residents: int):
+        self.residents = residents
+        self.bags = 0  # distinct sets of roles in play that can be dealt
+        self.errors: Dict[str, Fraction] = {}  # error message -> chance of hitting it
+        self.role_chances: Dict[str, Fraction] = {}  # role -> chance it is in play
+        self.outsider_chances: Dict[int, Fraction] = {}  # outsiders in play -> chance
+    
+    def error_chance(self) -> Fraction:
+        """Chance that RoleGenerator fails for this player count"""
+        return sum(self.errors.values(), Fraction(0))
+    
+    def to_dict(self) -> Dict:
+        """Serialise with exact fractions as "p/q" strings"""
+        return {
+            "residents": self.residents,
+            "bags": self.bags,
+            "errors": {message: str(p) for message, p in self.errors.items()},
+            "role_chances": {role: str(p) for role, p in sorted(self.role_chances.items())},
+            "outsider_chances": {str(k): str(p)
+                                 for k, p in sorted(self.outsider_chances.items())},
+        }
+    
+    @staticmethod
+    def from_dict(data: Dict) -> "SetupCounts":
+        """Read counts written by to_dict"""
+        counts = SetupCounts(data["residents"])
+        counts.bags = data["bags"]
+        counts.errors = {message: Fraction(p) for message, p in data["errors"].items()}
+        counts.role_chances = {role: Fraction(p) for role, p in data["role_chances"].items()}
+        counts.outsider_chances = {int(k): Fraction(p)
+                                   for k, p in data["outsider_chances"].items()}
+        return counts
+
+class SetupEnumeration:
+    """
+    Walks every branch of RoleGenerator's role drawing (services.setup_rules)
+    to give exact chances instead of simulated ones
+    Seating, travelers and bluffs don't change which roles are in play and
+    aren't enumerated
+    """
+    
+    VERSION = 1
+    
+    @staticmethod
+    def iter_outcomes(script: Script, residents: int) -> Iterator[Outcome]:
+        """
+        Lazily yield every branch of drawing a team, with its probability
+        The same bag can be reached by several branches; the probabilities
+        of all yielded outcomes sum to 1
+        """
+        path: List[int] = []
+        draw_ruled = _draw_ruled_roles()
+        while True:
+            rng = _BranchRandom(path, draw_ruled)
+            draft = SetupDraft(script, residents, rng)
+            try:
+                draft.draw_team()
+            except ValueError as e:
+                yield Outcome(None, str(e), rng.ways)
+            else:
+                yield Outcome(tuple(sorted(draft.in_play)), None, rng.ways)
+            if not rng.next_path():
+                return
+    
+    @staticmethod
+    def count(script: Script, residents: int) -> SetupCounts:
+        """Enumerate one player count and total up its outcomes"""
+        # Branches tallied per (key, ways) in ints, summed as fractions at the end
+        errors: Dict[Tuple[str, int], int] = {}
+        roles: Dict[Tuple[str, int], int] = {}
+        outsiders: Dict[Tuple[int, int], int] = {}
+        bags = set()
+        for outcome in SetupEnumeration.iter_outcomes(script, residents):
+            if outcome.error is not None:
+                key = (outcome.error, outcome.ways)
+                errors[key] = errors.get(key, 0) + 1
+                continue
+            bags.add(outcome.roles)
+            for role in outcome.roles:
+                key = (role, outcome.ways)
+                roles[key] = roles.get(key, 0) + 1
+            key = (sum(script.role_class(role) == "Outsider" for role in outcome.roles),
+                   outcome.ways)
+            outsiders[key] = outsiders.get(key, 0) + 1
+        
+        counts = SetupCounts(residents)
+        counts.bags = len(bags)
+        for tally, chances in ((errors, counts.errors), (roles, counts.role_chances),
+                               (outsiders, counts.outsider_chances)):
+            for (key, ways), branches in tally.items():
+                chances[key] = chances.get(key, 0) + Fraction(branches, ways)
+        return counts
+    
+    @staticmethod
+    def script_key(script: Script) -> str:
+        """
+        Digest of everything that decides the counts: the script's roles,
+        the role distribution and the setup rules of its roles
+        """
+        roles = [(role_type, list(script.get(role_type))) for role_type in ROLE_CLASSES]
+        rules = sorted(
+            (role, [(type(rule).__name__, sorted(vars(rule).items())) for rule in ruleset])
+            for role, ruleset in SETUP_RULES.items() if role in script.role_classes
+        )
+        content = repr((SetupEnumeration.VERSION, roles,
+                        sorted(script.distributions.items()), rules))
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+    
+    @staticmethod
+    def cached_counts(script: Script, residents: Iterable[int],
+                      cache_dir: str = SETUP_COUNTS_CACHE_DIR,
+                      refresh: bool = False) -> Dict[int, SetupCounts]:
+        """
+        Counts for each resident count, read from the disk cache where
+        possible; missing counts are enumerated and added to the cache
+        """
+        path = os.path.join(cache_dir, f"{SetupEnumeration.script_key(script)}.json")
+        cached: Dict[int, SetupCounts] = {}
+        if not refresh:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    cached = {counts["residents"]: SetupCounts.from_dict(counts)
+                              for counts in json.load(f)["counts"]}
+            except (OSError, ValueError, KeyError):
+                cached = {}
+        
+        missing = [r for r in residents if r not in cached]
+        for r in missing:
+            cached[r] = SetupEnumeration.count(script, r)
+        if missing:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = temp_path_for(path)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"script": script.name,
+                           "counts": [cached[r].to_dict() for r in sorted(cached)]}, f)
+            os.replace(temp_path, path)
+        return {r: cached[r] for r in residents}
\ No newline at end of file
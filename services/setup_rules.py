@@ -0,0 +1,251 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from models.script import ROLE_CLASSES, Script
+from models.setup import NO_ROLE, Setup, SetupBatch
+
+# Classes on the good team, which can fill any seat
+GOOD_CLASSES = ("Townsfolk", "Outsider")
+
+class SetupDraft:
+    """
+    A setup being built for one script and resident count
+    Roles are drawn class by class, then seated in a preallocated array
+    """
+    
+    def __init__(self, script: Script, residents: int, rng):
+        if residents not in script.distributions:
+            raise ValueError(f"Unsupported number of residents: {residents}")
+        self.script = script
+        self.residents = residents
+        self.rng = rng
+        self.counts = dict(zip(ROLE_CLASSES, script.distributions[residents]))
+        self.chosen: Dict[str, List[str]] = {role_type: [] for role_type in ROLE_CLASSES}
+        self.in_play = set()  # every chosen role, seated or not
+        self.unseated = set()  # chosen roles that take no seat (e.g. Lil' Monsta)
+        self.seats: List[Optional[str]] = [None] * residents
+        self.drunk_fake_role: Optional[str] = None
+        self.twin: Optional[int] = None
+    
+    def draw(self, role_type: str, count: int, error: str = "Not enough roles to sample"):
+        """
+        Choose count more roles of a class not already in play, then apply
+        the draw rules of each (which may change counts or draw more)
+        """
+        pool = self.script[role_type]
+        if self.chosen[role_type]:
+            pool = [role for role in pool if role not in self.in_play]
+        try:
+            drawn = self.rng.sample(pool, count)
+        except ValueError as e:
+            raise ValueError(f"{error}: {e}")
+        self.chosen[role_type].extend(drawn)
+        self.in_play.update(drawn)
+        if RULED_ROLES.isdisjoint(drawn):
+            return  # The usual case, checked without a lookup per role
+        for role in drawn:
+            for rule in SETUP_RULES.get(role, ()):
+                rule.on_draw(self, role)
+    
+    def draw_team(self):
+        """
+        Draw every class, then apply the rules that replace team members
+        The roles in play are final after this; nothing is seated yet
+        """
+        # Evil first: their rules change how many good roles are needed
+        for role_type in ("Minion", "Demon", "Townsfolk", "Outsider"):
+            self.draw(role_type, self.counts[role_type])
+        for rule, role in self.rules(self.seated_roles()):
+            rule.replace_team(self, role)
+    
+    def change_outsiders(self, delta: int):
+        """Swap Townsfolk for Outsiders (or back), as far as the script allows"""
+        outsiders = self.counts["Outsider"]
+        changed = min(max(outsiders + delta, 0), len(self.script["Outsider"]))
+        changed = min(changed, outsiders + self.counts["Townsfolk"])
+        self.counts["Townsfolk"] -= changed - outsiders
+        self.counts["Outsider"] = changed
+    
+    def seated_roles(self, role_types: Sequence[str] = ROLE_CLASSES) -> List[str]:
+        """Chosen roles of these classes that take a seat"""
+        return [role for role_type in role_types for role in self.chosen[role_type]
+                if role not in self.unseated]
+    
+    def rules(self, roles) -> List[Tuple["SetupRule", str]]:
+        """(rule, role) for every rule of these roles, in order"""
+        if RULED_ROLES.isdisjoint(self.in_play):
+            return []
+        return [(rule, role) for role in roles for rule in SETUP_RULES.get(role, ())]
+    
+    def seat_all(self):
+        """
+        Seat every seated role: constrained roles first (see SetupRule.seat),
+        then the rest shuffled into the free seats in one pass
+        """
+        roles = self.seated_roles()
+        for rule, role in self.rules(roles):
+            rule.seat(self, role)
+        
+        placed = set(self.seats)
+        rest = [role for role in roles if role not in placed]
+        self.rng.shuffle(rest)
+        free = iter(rest)
+        for seat, role in enumerate(self.seats):
+            if role is None:
+                self.seats[seat] = next(free)
+    
+    def place(self, role: str, seat: int):
+        """Put a role in a free seat"""
+        self.seats[seat] = role
+    
+    def seat_of(self, role: str) -> Optional[int]:
+        """The seat a role was put in, or None"""
+        try:
+            return self.seats.index(role)
+        except ValueError:
+            return None
+    
+    def free_seat(self) -> int:
+        """A random free seat"""
+        return self.rng.choice([seat for seat, role in enumerate(self.seats) if role is None])
+    
+    def mark_all(self):
+        """Apply the rules that act on seated roles (see SetupRule.mark)"""
+        if RULED_ROLES.isdisjoint(self.in_play):
+            return
+        for seat, role in enumerate(self.seats):
+            for rule in SETUP_RULES.get(role, ()):
+                rule.mark(self, role, seat)
+    
+    def finish(self, travelers: List[str], bluffs: List[str]) -> Setup:
+        """The finished setup"""
+        return Setup(self.seats + travelers, self.residents,
+                     self.drunk_fake_role, self.twin, bluffs)
+    
+    def finish_into(self, batch: SetupBatch, travelers: List[str], bluffs: List[str]):
+        """Append the finished setup to a batch as role IDs, without a Setup"""
+        ids = batch.role_ids
+        batch.roles.extend([ids[role] for role in self.seats])
+        batch.roles.extend([ids[role] for role in travelers])
+        batch.drunk_fake_roles.append(
+            NO_ROLE if self.drunk_fake_role is None else ids[self.drunk_fake_role]
+        )
+        batch.twins.append(-1 if self.twin is None else self.twin)
+        batch.bluffs.extend([ids[role] for role in bluffs])
+
+class SetupRule:
+    """
+    One way a role changes the setup while it is in play
+    Subclasses override the hooks for the steps they take part in:
+    on_draw (counts), replace_team (after every role is drawn), seat
+    (placement) and mark (after seating)
+    """
+    
+    def on_draw(self, draft: SetupDraft, role: str):
+        """Called as soon as the role is drawn, before later classes are drawn"""
+    
+    def replace_team(self, draft: SetupDraft, role: str):
+        """Called once every class has been drawn"""
+    
+    def seat(self, draft: SetupDraft, role: str):
+        """Called before seating; may place the role (and others it needs)"""
+    
+    def mark(self, draft: SetupDraft, role: str, seat: int):
+        """Called for the role's seat once everyone is seated"""
+
+class OutsiderChange(SetupRule):
+    """Change the number of Outsiders by one of deltas, chosen at random"""
+    
+    def __init__(self, *deltas: int):
+        self.deltas = deltas
+    
+    def on_draw(self, draft: SetupDraft, role: str):
+        delta = self.deltas[0] if len(self.deltas) == 1 else draft.rng.choice(self.deltas)
+        draft.change_outsiders(delta)
+
+class ReplacesDemon(SetupRule):
+    """
+    The Demon character isn't held by a player; another role of
+    role_type is in play instead
+    """
+    
+    def __init__(self, role_type: str = "Minion"):
+        self.role_type = role_type
+    
+    def on_draw(self, draft: SetupDraft, role: str):
+        draft.unseated.add(role)
+        draft.draw(self.role_type, 1)
+
+class GoodOnly(SetupRule):
+    """
+    Nobody is evil: every Minion and Demon seat gets another good role,
+    keeping about 2 Townsfolk to each Outsider
+    """
+    
+    def replace_team(self, draft: SetupDraft, role: str):
+        evil = draft.seated_roles(("Minion", "Demon"))
+        for role_type in ("Minion", "Demon"):
+            draft.in_play.difference_update(draft.chosen[role_type])
+            draft.chosen[role_type] = []
+        
+        available = {t: len(draft.script[t]) - len(draft.chosen[t]) for t in GOOD_CLASSES}
+        outsiders = min(len(evil) // 3, available["Outsider"])
+        townsfolk = min(len(evil) - outsiders, available["Townsfolk"])
+        outsiders = min(len(evil) - townsfolk, available["Outsider"])
+        error = "Not enough good roles for Atheist game"
+        if townsfolk + outsiders < len(evil):
+            raise ValueError(f"{error}: {townsfolk + outsiders} for {len(evil)} evil seats")
+        draft.draw("Townsfolk", townsfolk, error)
+        draft.draw("Outsider", outsiders, error)
+
+class SeatNextTo(SetupRule):
+    """Sit next to the (first) seated role of role_type, on a random side"""
+    
+    def __init__(self, role_type: str):
+        self.role_type = role_type
+    
+    def seat(self, draft: SetupDraft, role: str):
+        anchors = draft.seated_roles((self.role_type,))
+        if not anchors or draft.seat_of(role) is not None:
+            return
+        anchor = draft.seat_of(anchors[0])
+        if anchor is None:
+            anchor = draft.free_seat()
+            draft.place(anchors[0], anchor)
+        neighbours = [seat % draft.residents for seat in (anchor - 1, anchor + 1)
+                      if draft.seats[seat % draft.residents] is None]
+        if neighbours:
+            draft.place(role, draft.rng.choice(neighbours))
+
+class ThinksTheyAre(SetupRule):
+    """Is told they are a role of role_type that isn't in play (Setup.drunk_fake_role)"""
+    
+    def __init__(self, role_type: str = "Townsfolk"):
+        self.role_type = role_type
+    
+    def mark(self, draft: SetupDraft, role: str, seat: int):
+        pool = [r for r in draft.script[self.role_type] if r not in draft.in_play]
+        draft.drunk_fake_role = draft.rng.choice(pool) if pool else "unknown"
+
+class HasGoodTwin(SetupRule):
+    """A random good player is this role's twin"""
+    
+    def mark(self, draft: SetupDraft, role: str, seat: int):
+        good = [s for s, r in enumerate(draft.seats)
+                if draft.script.role_class(r) in GOOD_CLASSES]
+        if good:
+            draft.twin = draft.rng.choice(good)
+
+# role -> how it changes the setup; roles not listed don't change it
+SETUP_RULES: Dict[str, Tuple[SetupRule, ...]] = {
+    "Baron": (OutsiderChange(+2),),
+    "Godfather": (OutsiderChange(+1, -1),),
+    "Fang Gu": (OutsiderChange(+1),),
+    "Vigormortis": (OutsiderChange(-1),),
+    "Lil' Monsta": (ReplacesDemon("Minion"),),
+    "Atheist": (GoodOnly(),),
+    "Marionette": (SeatNextTo("Demon"),),
+    "Drunk": (ThinksTheyAre("Townsfolk"),),
+    "Evil Twin": (HasGoodTwin(),),
+}
+
+# Roles with any rule, so drafts without them can skip looking rules up
+RULED_ROLES = frozenset(SETUP_RULES)
\ No newline at end of file
@@ -0,0 +1,124 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from models.script import Script
+from services.role_generator import RoleGenerator
+
+class SetupHistogram:
+    """Counts from generating many setups of one or more grid cells"""
+    
+    def __init__(self):
+        self.setups = 0
+        self.errors: Dict[str, int] = {}  # error message -> setups that failed with it
+        self.role_counts: Dict[str, int] = {}  # role -> seats it was dealt to
+        self.outsider_counts: Dict[int, int] = {}  # outsiders in play -> setups
+        self.marionette_setups = 0
+        self.marionette_adjacent = 0  # of those, Marionette seated next to the Demon
+    
+    def add(self, roles: List[str], residents: int, script: Script):
+        """Count one setup's roles per seat, residents first"""
+        self.setups += 1
+        for role in roles:
+            self.role_counts[role] = self.role_counts.get(role, 0) + 1
+        
+        classes = [script.role_class(role) for role in roles[:residents]]
+        outsiders = classes.count("Outsider")
+        self.outsider_counts[outsiders] = self.outsider_counts.get(outsiders, 0) + 1
+        
+        if "Marionette" in roles[:residents]:
+            self.marionette_setups += 1
+            seat = roles.index("Marionette")
+            neighbours = (classes[(seat - 1) % residents], classes[(seat + 1) % residents])
+            if "Demon" in neighbours:
+                self.marionette_adjacent += 1
+    
+    def add_error(self, message: str):
+        """Count one setup that couldn't be generated"""
+        self.errors[message] = self.errors.get(message, 0) + 1
+    
+    def merge(self, other: "SetupHistogram"):
+        """Add another histogram's counts to this one"""
+        self.setups += other.setups
+        self.marionette_setups += other.marionette_setups
+        self.marionette_adjacent += other.marionette_adjacent
+        for mine, theirs in ((self.errors, other.errors),
+                             (self.role_counts, other.role_counts),
+                             (self.outsider_counts, other.outsider_counts)):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+    
+    def marionette_adjacency_rate(self) -> Optional[float]:
+        """Share of Marionette setups with the Marionette next to the Demon"""
+        if not self.marionette_setups:
+            return None
+        return self.marionette_adjacent / self.marionette_setups
+    
+    def to_dict(self) -> Dict:
+        """Serialise for a JSON report"""
+        return {
+            "setups": self.setups,
+            "errors": self.errors,
+            "role_counts": dict(sorted(self.role_counts.items())),
+            "outsider_counts": {str(k): v for k, v in sorted(self.outsider_counts.items())},
+            "marionette_setups": self.marionette_setups,
+            "marionette_adjacency_rate": self.marionette_adjacency_rate(),
+        }
+
+# A grid cell: (script name, residents, travelers)
+Cell = Tuple[str, int, int]
+
+class SetupSimulation:
+    """
+    Generates many setups for every (script, residents, travelers) cell in
+    worker processes and collects a SetupHistogram per cell
+    """
+    
+    @staticmethod
+    def run(scripts: Dict[str, Script], residents: Iterable[int] = range(5, 16),
+            travelers: Iterable[int] = (0,), setups: int = 10000, seed: int = 0,
+            workers: Optional[int] = None) -> Dict[Cell, SetupHistogram]:
+        """
+        Simulate every cell of the grid (workers defaults to every core)
+        The results only depend on seed, not on the number of workers
+        """
+        cells = [(name, r, t) for name in scripts for r in residents for t in travelers]
+        with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+            histograms = pool.map(
+                SetupSimulation._simulate_cell,
+                [scripts[name] for name, _, _ in cells],
+                [r for _, r, _ in cells],
+                [t for _, _, t in cells],
+                [setups] * len(cells),
+                [SetupSimulation.cell_seed(seed, cell) for cell in cells],
+            )
+            return dict(zip(cells, histograms))
+    
+    @staticmethod
+    def cell_seed(seed: int, cell: Cell) -> str:
+        """Seed for one cell's own random stream, the same in every process"""
+        name, residents, travelers = cell
+        return f"{seed}:{name}:{residents}:{travelers}"
+    
+    @staticmethod
+    def by_script(results: Dict[Cell, SetupHistogram]) -> Dict[str, SetupHistogram]:
+        """Merge the cells of each script into one histogram"""
+        merged: Dict[str, SetupHistogram] = {}
+        for (name, _, _), histogram in results.items():
+            merged.setdefault(name, SetupHistogram()).merge(histogram)
+        return merged
+    
+    @staticmethod
+    def _simulate_cell(script: Script, residents: int, travelers: int,
+                       setups: int, seed: str) -> SetupHistogram:
+        """Generate one cell's setups and count them (runs in workers)"""
+        rng = random.Random(seed)
+        histogram = SetupHistogram()
+        for _ in range(setups):
+            try:
+                setup = RoleGenerator.generate_setup(residents, travelers, script, rng)
+            except ValueError as e:
+                histogram.add_error(str(e))
+                continue
+            histogram.add(setup.roles, residents, script)
+        return histogram
\ No newline at end of file
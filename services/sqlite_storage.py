@@ -0,0 +1,334 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from itertools import chain
+from typing import List, Dict, Iterator, Optional, Tuple
+from config.constants import (MATCH_HISTORY_DB, MATCH_HISTORY_ENCODING, MATCH_HISTORY_ERRORS,
+                              MATCH_HISTORY_FILE, MATCH_HISTORY_LOCK_FILE)
+from models.player import Player
+from services.file_lock import FileLock, temp_path_for
+from services.match_storage import MatchStorage
+from services.match_table import COLUMNS, GAME_COLUMNS, MatchTable
+from services.stats_index import StatsIndex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    game_id TEXT NOT NULL,
+    winner TEXT NOT NULL,
+    storyteller TEXT NOT NULL,
+    script TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS players (
+    game INTEGER NOT NULL REFERENCES games(id),
+    class TEXT NOT NULL,
+    username TEXT NOT NULL,
+    role TEXT NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_games_game_id ON games(game_id);
+CREATE INDEX IF NOT EXISTS idx_games_script ON games(script);
+CREATE INDEX IF NOT EXISTS idx_games_storyteller ON games(storyteller);
+CREATE INDEX IF NOT EXISTS idx_players_username ON players(username);
+CREATE INDEX IF NOT EXISTS idx_players_game ON players(game);
+"""
+
+# Shared table and stats index, built on first use and kept up to date
+_table: Optional[MatchTable] = None
+_stats_index: Optional[StatsIndex] = None
+_shared_lock = threading.Lock()
+
+MATCH_COLUMNS = """
+    g.game_id, g.winner, g.storyteller, g.script,
+    p.class, p.username, p.role, p.result
+"""
+
+class SQLiteMatchStorage:
+    """Stores match history in a local SQLite database"""
+    
+    # Player rows inserted per executemany while migrating a CSV history
+    MIGRATE_BATCH_ROWS = 10000
+    
+    @staticmethod
+    def save_match(players: List[Player], winning_team: str, 
+                   storyteller: str, script: str) -> Dict:
+        """
+        Save a match to the database
+        Returns: the saved game, as MatchStorage.save_match does
+        """
+        rows = []
+        for player in players:
+            player_won = MatchStorage._is_player_winner(
+                player.player_class, winning_team
+            )
+            rows.append((
+                player.player_class,
+                player.username,
+                player.get_actual_role(),
+                "Win" if player_won else "Loss"
+            ))
+        
+        # Held across the insert so a concurrent load sees the game exactly once
+        with _shared_lock:
+            with closing(SQLiteMatchStorage._connect()) as conn, conn:
+                # Take the write lock first so the ID is unique across processes
+                conn.execute("BEGIN IMMEDIATE")
+                latest = conn.execute(
+                    "SELECT game_id FROM games ORDER BY id DESC LIMIT 1"
+                ).fetchone()
+                game_id = MatchStorage._new_game_id(latest[0] if latest else None)
+                SQLiteMatchStorage._insert_game(
+                    conn, game_id, winning_team, storyteller, script, rows
+                )
+            
+            values = [(game_id, winning_team, storyteller, script, *row) for row in rows]
+            if _table is not None:
+                _table.extend_values(values)
+            if _stats_index is not None:
+                _stats_index.add_rows(values)
+        return MatchStorage._game_record(values)
+    
+    @staticmethod
+    def append_games(games: List[List[Tuple[str, ...]]]):
+        """Insert whole games, each given as its rows' values, keeping their IDs"""
+        with _shared_lock:
+            with closing(SQLiteMatchStorage._connect()) as conn, conn:
+                for rows in games:
+                    SQLiteMatchStorage._insert_game(
+                        conn, *rows[0][:4], [row[4:] for row in rows]
+                    )
+            
+            values = [row for rows in games for row in rows]
+            if _table is not None:
+                _table.extend_values(values)
+            if _stats_index is not None:
+                _stats_index.add_rows(values)
+    
+    @staticmethod
+    def rename_player(old_username: str, new_username: str) -> int:
+        """
+        Rename a player throughout the database
+        Returns: number of rows changed
+        """
+        global _table, _stats_index
+        with closing(SQLiteMatchStorage._connect()) as conn, conn:
+            changed = conn.execute(
+                "UPDATE players SET username = ? WHERE username = ?",
+                (new_username, old_username)
+            ).rowcount
+        
+        if changed:
+            with _shared_lock:
+                # Rebuilt on next use
+                _table = None
+                _stats_index = None
+        return changed
+    
+    @staticmethod
+    def load_matches(workers: int = 1) -> List[Dict]:
+        """Load all matches from the database (workers is ignored)"""
+        return SQLiteMatchStorage._query(
+            f"SELECT {MATCH_COLUMNS} FROM players p "
+            "JOIN games g ON g.id = p.game ORDER BY p.rowid"
+        )
+    
+    @staticmethod
+    def load_table(workers: int = 1) -> MatchTable:
+        """
+        Get all matches as a shared columnar MatchTable, queried on first
+        use and kept up to date by save_match
+        workers is accepted for MatchStorage compatibility; SQLite does the parsing
+        """
+        for _ in SQLiteMatchStorage.iter_load():
+            pass
+        return _table
+    
+    @staticmethod
+    def iter_load(chunk_rows: int = 50000) -> Iterator[Tuple[int, int]]:
+        """
+        Build the shared table a chunk of rows at a time
+        Yields (rows loaded, total rows) after each chunk
+        """
+        global _table
+        with _shared_lock:
+            if _table is not None:
+                yield len(_table), len(_table)
+                return
+            
+            table = MatchTable()
+            with closing(SQLiteMatchStorage._connect()) as conn:
+                total = conn.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+                cursor = conn.execute(
+                    f"SELECT {MATCH_COLUMNS} FROM players p "
+                    "JOIN games g ON g.id = p.game ORDER BY p.rowid"
+                )
+                while True:
+                    rows = cursor.fetchmany(chunk_rows)
+                    if not rows:
+                        break
+                    table.extend_values(rows)
+                    yield len(table), total
+            _table = table
+    
+    @staticmethod
+    def load_stats() -> StatsIndex:
+        """
+        Get the shared stats index, built with one aggregate query on first
+        use and kept up to date by save_match
+        """
+        global _stats_index
+        with _shared_lock:
+            if _stats_index is None:
+                index = StatsIndex()
+                with closing(SQLiteMatchStorage._connect()) as conn:
+                    for row in conn.execute(
+                        "SELECT p.username, g.script, p.role, "
+                        "SUM(p.result = 'Win'), COUNT(*) "
+                        "FROM players p JOIN games g ON g.id = p.game "
+                        "GROUP BY p.username, g.script, p.role"
+                    ):
+                        index.add_counts(*row)
+                _stats_index = index
+            return _stats_index
+    
+    @staticmethod
+    def iter_matches(username: Optional[str] = None, script: Optional[str] = None,
+                     storyteller: Optional[str] = None, since: Optional[int] = None,
+                     until: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Lazily yield matches that pass all the given filters
+        since/until are inclusive Unix timestamps compared with the game ID
+        """
+        conditions = []
+        params = []
+        for column, value in (("p.username", username), ("g.script", script),
+                              ("g.storyteller", storyteller)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            conditions.append("CAST(g.game_id AS INTEGER) >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("CAST(g.game_id AS INTEGER) <= ?")
+            params.append(until)
+        
+        sql = f"SELECT {MATCH_COLUMNS} FROM players p JOIN games g ON g.id = p.game"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        
+        with closing(SQLiteMatchStorage._connect()) as conn:
+            for row in conn.execute(sql + " ORDER BY p.rowid", params):
+                yield dict(zip(COLUMNS, row))
+    
+    @staticmethod
+    def get_game(game_id: str) -> Optional[Dict]:
+        """Get one game (see MatchStorage._game_record) using the game ID index"""
+        with closing(SQLiteMatchStorage._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {MATCH_COLUMNS} FROM games g JOIN players p ON p.game = g.id "
+                "WHERE g.id = (SELECT MIN(id) FROM games WHERE game_id = ?) "
+                "ORDER BY p.rowid",
+                (game_id,)
+            ).fetchall()
+        return MatchStorage._game_record(rows) if rows else None
+    
+    @staticmethod
+    def get_all_usernames() -> set:
+        """Get all unique usernames from match history"""
+        with closing(SQLiteMatchStorage._connect()) as conn:
+            return {row[0] for row in 
+                    conn.execute("SELECT DISTINCT username FROM players")}
+    
+    @staticmethod
+    def migrate_from_csv(csv_path: str = MATCH_HISTORY_FILE, 
+                         db_path: str = MATCH_HISTORY_DB) -> int:
+        """
+        Copy every game from a CSV history file into the database
+        Returns: number of games migrated
+        """
+        if not os.path.exists(csv_path):
+            return 0
+        
+        games = 0
+        with open(csv_path, newline="", encoding=MATCH_HISTORY_ENCODING,
+                  errors=MATCH_HISTORY_ERRORS) as f, \
+             closing(SQLiteMatchStorage._connect(db_path, migrate=False)) as conn, conn:
+            # Old 4-column rows get their result filled in by the parser
+            values = MatchStorage._iter_values(f)
+            if csv_path == MATCH_HISTORY_FILE:
+                # Games rolled into the archive are part of the same history
+                values = chain(MatchStorage._iter_archived_values(), values)
+            
+            # Streamed a batch at a time rather than read into memory first
+            players = []
+            for rows in MatchStorage._iter_games(values):
+                cursor = conn.execute(
+                    "INSERT INTO games (game_id, winner, storyteller, script) "
+                    "VALUES (?, ?, ?, ?)", rows[0][:len(GAME_COLUMNS)]
+                )
+                players.extend((cursor.lastrowid, *row[len(GAME_COLUMNS):]) for row in rows)
+                games += 1
+                if len(players) >= SQLiteMatchStorage.MIGRATE_BATCH_ROWS:
+                    SQLiteMatchStorage._insert_players(conn, players)
+                    players = []
+            SQLiteMatchStorage._insert_players(conn, players)
+        
+        return games
+    
+    @staticmethod
+    def _connect(db_path: str = MATCH_HISTORY_DB, 
+                 migrate: bool = True) -> sqlite3.Connection:
+        """Open the database, creating it (and migrating the CSV) if needed"""
+        if migrate and not os.path.exists(db_path):
+            SQLiteMatchStorage._create_from_csv(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.executescript(SCHEMA)
+        return conn
+    
+    @staticmethod
+    def _create_from_csv(db_path: str):
+        """
+        Create the database with the CSV history migrated into it
+        It is built under a temporary name and only moved into place once
+        complete, so an interrupted first start migrates again next time
+        """
+        # Held so two instances starting at once don't both migrate
+        with FileLock(MATCH_HISTORY_LOCK_FILE):
+            if os.path.exists(db_path):
+                return
+            temp_path = temp_path_for(db_path)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)  # left by an interrupted migration
+            with closing(SQLiteMatchStorage._connect(temp_path, migrate=False)):
+                pass
+            SQLiteMatchStorage.migrate_from_csv(db_path=temp_path)
+            os.replace(temp_path, db_path)
+    
+    @staticmethod
+    def _insert_game(conn: sqlite3.Connection, game_id: str, winner: str,
+                     storyteller: str, script: str, rows: List[tuple]):
+        """Insert one game and its player rows"""
+        cursor = conn.execute(
+            "INSERT INTO games (game_id, winner, storyteller, script) "
+            "VALUES (?, ?, ?, ?)",
+            (game_id, winner, storyteller, script)
+        )
+        SQLiteMatchStorage._insert_players(
+            conn, [(cursor.lastrowid, *row) for row in rows]
+        )
+    
+    @staticmethod
+    def _insert_players(conn: sqlite3.Connection, rows: List[tuple]):
+        """Insert player rows, each starting with its game's row ID"""
+        conn.executemany(
+            "INSERT INTO players (game, class, username, role, result) "
+            "VALUES (?, ?, ?, ?, ?)", rows
+        )
+    
+    @staticmethod
+    def _query(sql: str, params=()) -> List[Dict]:
+        """Run a match query and return rows in the load_matches format"""
+        with closing(SQLiteMatchStorage._connect()) as conn:
+            return [dict(zip(COLUMNS, row)) for row in conn.execute(sql, params)]
\ No newline at end of file
@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from collections import Counter
+from services.file_lock import temp_path_for
+from services.match_table import MatchTable
+
+class StatsIndex:
+    """
+    Win/total counters kept up to date as matches are saved
+    Keyed by username, (username, script), (username, script, role)
+    and (script, role)
+    """
+    
+    VERSION = 1
+    
+    def __init__(self):
+        # username -> script -> role -> [wins, total]; the other counters
+        # are rolled up from this one
+        self.player_roles: Dict[str, Dict[str, Dict[str, List[int]]]] = {}
+        self.players: Dict[str, List[int]] = {}
+        self.player_scripts: Dict[str, Dict[str, List[int]]] = {}
+        self.script_roles: Dict[str, Dict[str, List[int]]] = {}
+        
+        # What part of the history these counts cover (owned by the storage)
+        self.source: Dict = {}
+        
+        # Saves update the index from the writer thread
+        self._lock = threading.RLock()
+    
+    def add(self, username: str, script: str, role: str, won: bool):
+        """Count one player-row"""
+        self.add_counts(username, script, role, 1 if won else 0, 1)
+    
+    def add_rows(self, rows: Iterable[Sequence[str]]):
+        """Count rows given as values in match_table.COLUMNS order"""
+        with self._lock:
+            for row in rows:
+                self.add(row[5], row[3], row[6], row[7] == "Win")
+    
+    def add_table(self, table: MatchTable, rows: Optional[int] = None):
+        """Count the first rows of a MatchTable (all of them by default)"""
+        rows = len(table) if rows is None else rows
+        fields = ("username", "script", "role", "result")
+        # Tallied on the string IDs, so each string is only looked up once
+        tally = Counter(zip(*(table.columns[c][:rows] for c in fields)))
+        win = table.pools["result"].get_id("Win")
+        counts: Dict[Tuple[int, int, int], List[int]] = {}
+        for (username, script, role, result), n in tally.items():
+            stats = counts.setdefault((username, script, role), [0, 0])
+            stats[0] += n if result == win else 0
+            stats[1] += n
+        
+        usernames, scripts, roles = (table.pools[c] for c in fields[:3])
+        with self._lock:
+            for (username, script, role), (wins, total) in counts.items():
+                self.add_counts(usernames[username], scripts[script], roles[role],
+                                wins, total)
+    
+    def add_counts(self, username: str, script: str, role: str, 
+                   wins: int, total: int):
+        """Add pre-aggregated counts for one (username, script, role)"""
+        with self._lock:
+            for stats in (
+                self.player_roles.setdefault(username, {})
+                    .setdefault(script, {}).setdefault(role, [0, 0]),
+                self.players.setdefault(username, [0, 0]),
+                self.player_scripts.setdefault(username, {}).setdefault(script, [0, 0]),
+                self.script_roles.setdefault(script, {}).setdefault(role, [0, 0]),
+            ):
+                stats[0] += wins
+                stats[1] += total
+    
+    def usernames(self) -> set:
+        """Get every username with at least one game"""
+        with self._lock:
+            return set(self.players)
+    
+    def games_played(self) -> Dict[str, int]:
+        """Get the number of games played by each username"""
+        with self._lock:
+            return {username: total for username, (_, total) in self.players.items()}
+    
+    def player_stats(self, username: str) -> Tuple[int, int]:
+        """(wins, total) for a player across all scripts"""
+        with self._lock:
+            return tuple(self.players.get(username, (0, 0)))
+    
+    def player_script_stats(self, username: str, script: str) -> Tuple[int, int]:
+        """(wins, total) for a player on one script"""
+        with self._lock:
+            return tuple(self.player_scripts.get(username, {}).get(script, (0, 0)))
+    
+    def role_stats(self, username: str, 
+                   script: Optional[str] = None) -> Dict[str, Tuple[int, int]]:
+        """(wins, total) per role for a player, on one script or all of them"""
+        with self._lock:
+            by_script = self.player_roles.get(username, {})
+            if script is not None:
+                return {role: tuple(stats) 
+                        for role, stats in by_script.get(script, {}).items()}
+            
+            merged: Dict[str, List[int]] = {}
+            for roles in by_script.values():
+                for role, (wins, total) in roles.items():
+                    stats = merged.setdefault(role, [0, 0])
+                    stats[0] += wins
+                    stats[1] += total
+            return {role: tuple(stats) for role, stats in merged.items()}
+    
+    def script_role_stats(self, script: str) -> Dict[str, Tuple[int, int]]:
+        """(wins, total) per role on a script across all players"""
+        with self._lock:
+            return {role: tuple(stats) 
+                    for role, stats in self.script_roles.get(script, {}).items()}
+    
+    def save(self, path: str):
+        """Write the index to a sidecar file, atomically"""
+        with self._lock:
+            text = json.dumps({
+                "version": self.VERSION,
+                "source": self.source,
+                "player_roles": self.player_roles,
+            }, separators=(",", ":"))
+        
+        temp_path = temp_path_for(path)
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+    
+    @staticmethod
+    def load(path: str) -> Optional["StatsIndex"]:
+        """Read an index written by save, or None if missing or unusable"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if data.get("version") != StatsIndex.VERSION:
+            return None
+        
+        index = StatsIndex()
+        index.source = data["source"]
+        for username, scripts in data["player_roles"].items():
+            for script, roles in scripts.items():
+                for role, (wins, total) in roles.items():
+                    index.add_counts(username, script, role, wins, total)
+        return index
\ No newline at end of file
@@ -0,0 +1,9 @@
+from config.constants import STORAGE_BACKEND
+from services.match_storage import MatchStorage
+
+def get_match_storage():
+    """Get the match storage backend selected in the config"""
+    if STORAGE_BACKEND == "sqlite":
+        from services.sqlite_storage import SQLiteMatchStorage
+        return SQLiteMatchStorage
+    return MatchStorage
\ No newline at end of file
@@ -0,0 +1,88 @@
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple
+
+class UsernameIndex:
+    """
+    Fast username lookup for autocomplete
+    Prefix search bisects a sorted list of lowercased names; substring
+    search intersects an inverted index of 1- to 3-character n-grams
+    """
+    
+    MAX_GRAM = 3
+    
+    def __init__(self, games_played: Optional[Dict[str, int]] = None):
+        self.games: Dict[str, int] = {}
+        self._sorted: List[Tuple[str, str]] = []  # (lowercased, username)
+        self._grams: Dict[str, Set[str]] = {}
+        
+        # Bulk load: sort once rather than inserting names one at a time
+        for username, games in (games_played or {}).items():
+            self.games[username] = games
+            self._index_grams(username)
+        self._sorted = sorted((u.lower(), u) for u in self.games)
+    
+    def __len__(self) -> int:
+        return len(self.games)
+    
+    def add(self, username: str, games: int = 1):
+        """Add a username, or add games to one already indexed"""
+        if username in self.games:
+            self.games[username] += games
+            return
+        
+        self.games[username] = games
+        insort(self._sorted, (username.lower(), username))
+        self._index_grams(username)
+    
+    def prefix_matches(self, prefix: str) -> List[str]:
+        """Get usernames starting with prefix (case-insensitive)"""
+        prefix = prefix.lower()
+        matches = []
+        for i in range(bisect_left(self._sorted, (prefix, "")), len(self._sorted)):
+            lowered, username = self._sorted[i]
+            if not lowered.startswith(prefix):
+                break
+            matches.append(username)
+        return matches
+    
+    def substring_matches(self, text: str) -> Set[str]:
+        """Get usernames containing text (case-insensitive)"""
+        text = text.lower()
+        if len(text) <= self.MAX_GRAM:
+            return set(self._grams.get(text, ()))
+        
+        # Every trigram of the text must appear in the name; start from the rarest
+        postings = sorted((self._grams.get(text[i:i + self.MAX_GRAM], set()) 
+                           for i in range(len(text) - self.MAX_GRAM + 1)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return {u for u in candidates if text in u.lower()}
+    
+    def search(self, text: str, limit: int = 10) -> List[str]:
+        """
+        Get up to limit usernames matching text, most games played first
+        Names starting with text are ranked ahead of other substring matches
+        """
+        if not text:
+            return []
+        
+        key = lambda u: (-self.games[u], u.lower())
+        prefixed = heapq.nsmallest(limit, self.prefix_matches(text), key=key)
+        if len(prefixed) == limit:
+            return prefixed
+        
+        others = self.substring_matches(text).difference(prefixed)
+        return prefixed + heapq.nsmallest(limit - len(prefixed), others, key=key)
+    
+    def _index_grams(self, username: str):
+        """Add a name to the posting set of every n-gram it contains"""
+        lowered = username.lower()
+        grams = {lowered[i:i + n] 
+                 for n in range(1, self.MAX_GRAM + 1) 
+                 for i in range(len(lowered) - n + 1)}
+        for gram in grams:
+            self._grams.setdefault(gram, set()).add(username)
\ No newline at end of file
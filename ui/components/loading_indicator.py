@@ -0,0 +1,67 @@
+from tkinter import ttk
+from typing import Callable, Optional
+
+class LoadingIndicator(ttk.Frame):
+    """
+    Progress bar and label shown while the match history loads
+    With on_retry, a failed load offers a Retry button that calls it
+    """
+    
+    def __init__(self, parent, text: str = "Loading match history...",
+                 on_retry: Optional[Callable[[], None]] = None):
+        super().__init__(parent)
+        self.text = text
+        self.on_retry = on_retry
+        self._failed = False
+        
+        self.label = ttk.Label(self, text=text)
+        self.label.pack(side='left', padx=(0, 10))
+        self.progress = ttk.Progressbar(self, mode="indeterminate", length=200)
+        self.progress.pack(side='left', fill='x', expand=True)
+        self.retry_button = ttk.Button(self, text="Retry", command=self._retry)
+    
+    def show(self, **pack_options):
+        """Show the indicator, animating until the first progress update"""
+        self.progress.config(mode="indeterminate")
+        self.progress.start()
+        self.pack(**pack_options)
+    
+    def update_progress(self, done: int, total: int):
+        """Show how far the load has got"""
+        self._clear_error()  # A retried load, perhaps started from another tab
+        if total <= 0:
+            return
+        self.progress.stop()
+        self.progress.config(mode="determinate", maximum=total, value=done)
+        self.label.config(text=f"{self.text} {done * 100 // total}%")
+    
+    def show_error(self, error: Exception):
+        """Replace the progress bar with the reason the load failed"""
+        self._failed = True
+        self.progress.stop()
+        self.progress.pack_forget()
+        self.label.config(text=f"Failed to load match history: {error}")
+        if self.on_retry is not None:
+            self.retry_button.pack(side='left')
+    
+    def hide(self):
+        """Hide the indicator"""
+        self._clear_error()
+        self.progress.stop()
+        self.pack_forget()
+    
+    def _retry(self):
+        """Go back to showing progress and try loading again"""
+        self._clear_error()
+        self.progress.config(mode="indeterminate")
+        self.progress.start()
+        self.on_retry()
+    
+    def _clear_error(self):
+        """Put the progress bar back in place of a failed load's message"""
+        if not self._failed:
+            return
+        self._failed = False
+        self.retry_button.pack_forget()
+        self.label.config(text=self.text)
+        self.progress.pack(side='left', fill='x', expand=True)
@@ -1,23 +1,97 @@
 import tkinter as tk
 from tkinter import ttk
-from services.match_storage import MatchStorage
+from typing import Dict, List, Union
+from scripts import scripts
+from services.history_repository import HistoryRepository
+from services.match_table import COLUMNS, GAME_COLUMNS, MatchTable
+from ui.components.loading_indicator import LoadingIndicator
 
 class HistoryTab:
     """Match history tab"""
     
-    def __init__(self, parent):
+    # Games added to the tree per page
+    PAGE_SIZE = 100
+    
+    # Load the next page when scrolled this close to the bottom
+    SCROLL_LOAD_THRESHOLD = 0.95
+    
+    def __init__(self, parent, repository: HistoryRepository):
         self.frame = ttk.Frame(parent)
+        self.repository = repository
+        self.table = MatchTable()
+        self.filters = {}
+        self.table_games = 0  # games in the table when it was loaded
+        self.games_shown = 0
+        self.games_added = 0  # games saved since, shown at the top
+        
+        # parent item -> game number in the table, or the saved game's rows,
+        # for games whose player rows haven't been inserted yet
+        self.unopened: Dict[str, Union[int, List[Dict]]] = {}
+        self._load_pending = False
         self._build_ui()
+        
+        repository.subscribe(HistoryRepository.LOADED, 
+                             lambda: self.load_history(**self.filters))
+        repository.subscribe(HistoryRepository.LOAD_PROGRESS, 
+                             self.loading_indicator.update_progress)
+        repository.subscribe(HistoryRepository.LOAD_FAILED, 
+                             self.loading_indicator.show_error)
+        repository.subscribe(HistoryRepository.MATCH_ADDED, self.add_game)
+        repository.subscribe(HistoryRepository.PLAYER_RENAMED, self._on_player_renamed)
     
     def _build_ui(self):
         """Build the UI"""
+        # Shown until the first load finishes
+        self.loading_indicator = LoadingIndicator(self.frame, 
+                                                  on_retry=self.repository.load_async)
+        self.loading_indicator.show(fill='x', padx=10, pady=(10, 0))
+        
+        # Filters
+        filter_frame = ttk.Frame(self.frame)
+        filter_frame.pack(fill='x', padx=10, pady=(10, 0))
+        
+        self.username_filter_var = tk.StringVar()
+        self.storyteller_filter_var = tk.StringVar()
+        for text, var in (("Player:", self.username_filter_var),
+                          ("Storyteller:", self.storyteller_filter_var)):
+            ttk.Label(filter_frame, text=text).pack(side='left')
+            entry = ttk.Entry(filter_frame, textvariable=var, width=15)
+            entry.pack(side='left', padx=(5, 10))
+            entry.bind("<Return>", self._apply_filters)
+        
+        ttk.Label(filter_frame, text="Script:").pack(side='left')
+        self.script_filter_var = tk.StringVar(value="All")
+        script_dropdown = ttk.Combobox(filter_frame, textvariable=self.script_filter_var,
+                                       state="readonly", width=20)
+        script_dropdown['values'] = ['All'] + list(scripts.keys())
+        script_dropdown.pack(side='left', padx=(5, 10))
+        
+        ttk.Button(filter_frame, text="Filter", 
+                   command=self._apply_filters).pack(side='left', padx=(0, 5))
+        ttk.Button(filter_frame, text="Clear", 
+                   command=self._clear_filters).pack(side='left')
+        
         history_frame = ttk.Frame(self.frame)
         history_frame.pack(fill='both', expand=True, padx=10, pady=10)
         
         # Create treeview
         self.tree = ttk.Treeview(history_frame)
+        scrollbar = ttk.Scrollbar(history_frame, orient="vertical", 
+                                  command=self.tree.yview)
+        self.tree.configure(yscrollcommand=lambda first, last: 
+                            self._on_scroll(scrollbar, first, last))
+        scrollbar.pack(side='right', fill='y')
         self.tree.pack(fill='both', expand=True)
         
+        # Paging controls
+        paging_frame = ttk.Frame(self.frame)
+        paging_frame.pack(fill='x', padx=10, pady=(0, 10))
+        self.count_label = ttk.Label(paging_frame, text="")
+        self.count_label.pack(side='left')
+        self.load_more_button = ttk.Button(paging_frame, text="Load More", 
+                                           command=self.load_more)
+        self.load_more_button.pack(side='right')
+        
         # Configure columns
         self.tree["columns"] = ("class", "username", "role")
         self.tree.heading("#0", text="Match")
@@ -49,43 +123,133 @@ class HistoryTab:
         self.tree.tag_configure("loss", 
                                background=loss_color, 
                                foreground="black")
+        
+        # Player rows are only inserted when a game is expanded
+        self.tree.bind("<<TreeviewOpen>>", self._on_open)
     
-    def load_history(self):
-        """Load match history into the tree"""
+    def load_history(self, **filters):
+        """
+        Load match history and show the newest page of games
+        Accepts the same filters as iter_matches (username, script, ...)
+        """
+        self.loading_indicator.hide()
+        self.filters = filters
+        if filters:
+            # Filtered rows are streamed into a small table of their own
+            self.table = MatchTable()
+            self.table.extend_values(tuple(m[c] for c in COLUMNS) 
+                                     for m in self.repository.iter_matches(**filters))
+        else:
+            self.table = self.repository.table
+        
         # Clear existing
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-        
-        # Load matches
-        matches = MatchStorage.load_matches()
-        
-        # Group by match_id
-        grouped = {}
-        for match in reversed(matches):  # Newest first
-            match_id = f"{match['game_id']}|{match['winner']}|{match['storyteller']}|{match['script']}"
-            if match_id not in grouped:
-                grouped[match_id] = []
-            grouped[match_id].append(match)
-        
-        # Populate tree
-        for match_id, entries in grouped.items():
-            parts = match_id.split("|")
-            game_id, winner, storyteller, script = parts
-            
-            # Parent row
-            parent_tag = "townsfolk_win" if winner == "Townsfolk" else "demon_win"
-            parent = self.tree.insert(
-                "", "end",
-                text=f"Game {game_id} | Winner: {winner} | Storyteller: {storyteller} | Script: {script}",
-                open=False,
-                tags=(parent_tag,)
+        self.tree.delete(*self.tree.get_children())
+        self.unopened.clear()
+        self.table_games = self.table.game_count()
+        self.games_shown = 0
+        self.games_added = 0
+        
+        self.load_more()
+    
+    def _apply_filters(self, event=None):
+        """Show only the rows matching the filter bar"""
+        filters = {"username": self.username_filter_var.get().strip(),
+                   "storyteller": self.storyteller_filter_var.get().strip(),
+                   "script": self.script_filter_var.get()}
+        self.load_history(**{k: v for k, v in filters.items() if v and v != "All"})
+    
+    def _clear_filters(self):
+        """Reset the filter bar and show every game again"""
+        self.username_filter_var.set("")
+        self.storyteller_filter_var.set("")
+        self.script_filter_var.set("All")
+        self.load_history()
+    
+    def _on_player_renamed(self, old_username: str, new_username: str):
+        """Reload, following the rename if the view is filtered on that player"""
+        if self.filters.get("username") == old_username:
+            self.filters["username"] = new_username
+            self.username_filter_var.set(new_username)
+        self.load_history(**self.filters)
+    
+    def add_game(self, game: Dict):
+        """Show a just-saved game at the top without reloading the history"""
+        if self.filters:
+            # Re-query a filtered view so the game only shows if it matches
+            self.load_history(**self.filters)
+            return
+        
+        self._insert_game(0, [game[c] for c in GAME_COLUMNS], game["rows"])
+        self.games_added += 1
+        self._update_count()
+    
+    def load_more(self):
+        """Add the next page of games, newest first"""
+        self._load_pending = False
+        page_end = min(self.table_games, self.games_shown + self.PAGE_SIZE)
+        
+        for shown in range(self.games_shown, page_end):
+            game = self.table_games - 1 - shown
+            start, _ = self.table.game_span(game)
+            header = [self.table.value(c, start) for c in GAME_COLUMNS]
+            self._insert_game("end", header, game)
+        
+        self.games_shown = page_end
+        self._update_count()
+    
+    def _insert_game(self, index: Union[int, str], header: List[str], 
+                     rows: Union[int, List[Dict]]):
+        """Insert a game's parent row; its player rows wait until it is opened"""
+        game_id, winner, storyteller, script = header
+        
+        # Parent row
+        parent_tag = "townsfolk_win" if winner == "Townsfolk" else "demon_win"
+        parent = self.tree.insert(
+            "", index,
+            text=f"Game {game_id} | Winner: {winner} | Storyteller: {storyteller} | Script: {script}",
+            open=False,
+            tags=(parent_tag,)
+        )
+        
+        # Placeholder so the game can be expanded
+        self.tree.insert(parent, "end")
+        self.unopened[parent] = rows
+    
+    def _update_count(self):
+        """Update the paging label and button"""
+        total = self.table_games + self.games_added
+        shown = self.games_shown + self.games_added
+        self.count_label.config(text=f"Showing {shown} of {total} games")
+        if self.games_shown < self.table_games:
+            self.load_more_button.state(["!disabled"])
+        else:
+            self.load_more_button.state(["disabled"])
+    
+    def _on_open(self, event=None):
+        """Insert a game's player rows the first time it is expanded"""
+        parent = self.tree.focus()
+        rows = self.unopened.pop(parent, None)
+        if rows is None:
+            return
+        
+        self.tree.delete(*self.tree.get_children(parent))
+        if isinstance(rows, int):
+            start, end = self.table.game_span(rows)
+            rows = list(self.table.iter_rows(range(start, end)))
+        
+        # Child rows
+        for entry in reversed(rows):
+            tag = entry["result"].lower()
+            self.tree.insert(
+                parent, "end",
+                values=(entry["class"], entry["username"], entry["role"]),
+                tags=(tag,)
             )
-            
-            # Child rows
-            for entry in entries:
-                tag = entry["result"].lower()
-                self.tree.insert(
-                    parent, "end",
-                    values=(entry["class"], entry["username"], entry["role"]),
-                    tags=(tag,)
-                )
\ No newline at end of file
+    
+    def _on_scroll(self, scrollbar: ttk.Scrollbar, first: str, last: str):
+        """Keep the scrollbar in sync and load more games near the bottom"""
+        scrollbar.set(first, last)
+        if (float(last) >= self.SCROLL_LOAD_THRESHOLD and not self._load_pending
+                and self.games_shown < self.table_games):
+            self._load_pending = True
+            self.frame.after_idle(self.load_more)
\ No newline at end of file
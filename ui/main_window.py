@@ -4,6 +4,8 @@ from ui.role_tab import RoleTab
 from ui.history_tab import HistoryTab
 from ui.search_tab import SearchTab
 from models.game_state import GameState
+from services.history_repository import HistoryRepository
+from services.storage import get_match_storage
 
 class MainWindow:
     """Main application window"""
@@ -16,25 +18,28 @@ class MainWindow:
         # Shared game state
         self.game_state = GameState()
         
+        # The one shared copy of the match history
+        self.repository = HistoryRepository(root, get_match_storage())
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Create notebook
         self.notebook = ttk.Notebook(root)
         self.notebook.pack(fill='both', expand=True)
         
         # Create tabs
-        self.role_tab = RoleTab(self.notebook, self.game_state, self.on_match_saved)
-        self.history_tab = HistoryTab(self.notebook)
-        self.search_tab = SearchTab(self.notebook)
+        self.role_tab = RoleTab(self.notebook, self.game_state, self.repository)
+        self.history_tab = HistoryTab(self.notebook, self.repository)
+        self.search_tab = SearchTab(self.notebook, self.repository)
         
         # Add tabs to notebook
         self.notebook.add(self.role_tab.frame, text='Role Generator')
         self.notebook.add(self.history_tab.frame, text='Match History')
         self.notebook.add(self.search_tab.frame, text='Player Search')
         
-        # Initial load
-        self.history_tab.load_history()
-        self.search_tab.load_data()
+        # Load in the background; the tabs fill themselves in when it's done
+        self.repository.load_async()
     
-    def on_match_saved(self):
-        """Callback when a match is saved"""
-        self.history_tab.load_history()
-        self.search_tab.load_data()
\ No newline at end of file
+    def on_close(self):
+        """Finish pending saves before closing the window"""
+        self.repository.close()
+        self.root.destroy()
\ No newline at end of file
@@ -1,23 +1,25 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from typing import Callable
-from scripts import scripts
+from scripts import compiled_scripts, scripts
 from config.constants import MIN_PLAYERS, MAX_RESIDENTS, MAX_TRAVELERS, MAX_PLAYERS
 from models.game_state import GameState
 from services.role_generator import RoleGenerator
-from services.match_storage import MatchStorage
+from services.history_repository import HistoryRepository
 from ui.components.player_row import PlayerRowManager
 
 class RoleTab:
     """Role generator tab"""
     
-    def __init__(self, parent, game_state: GameState, on_match_saved: Callable):
+    def __init__(self, parent, game_state: GameState, repository: HistoryRepository):
         self.frame = ttk.Frame(parent)
         self.game_state = game_state
-        self.on_match_saved = on_match_saved
+        self.repository = repository
         self.player_row_manager = None
+        self._save_error_shown = False
         
         self._build_ui()
+        
+        self.repository.subscribe(HistoryRepository.SAVE_FAILED, self._on_save_error)
     
     def _build_ui(self):
         # Script selector
@@ -127,7 +129,7 @@ class RoleTab:
             return
         
         script_name = self.script_var.get()
-        script_roles = scripts.get(script_name)
+        script_roles = compiled_scripts.get(script_name)
         
         num_residents = self.player_row_manager.num_residents
         num_travelers = self.player_row_manager.num_travelers
@@ -187,18 +189,34 @@ class RoleTab:
             messagebox.showerror("Invalid Data", error)
             return
         
-        # Save
+        # Save in the background; the grimoire resets straight away, as the
+        # match is journaled until it is saved (see SaveJournal)
         try:
-            MatchStorage.save_match(
+            self.repository.save_match(
                 self.game_state.players,
                 winning_team,
                 storyteller,
                 self.game_state.script_name
             )
-            self.on_match_saved()
-            self.reset()
         except Exception as e:
             messagebox.showerror("Save Error", f"Failed to save match: {e}")
+            return
+        self.reset()
+    
+    def _on_save_error(self, error: Exception):
+        """Report a background save failure and offer to retry"""
+        if self._save_error_shown:
+            return  # One prompt covers every failed match
+        self._save_error_shown = True
+        retry = messagebox.askretrycancel(
+            "Save Error", 
+            f"Failed to save match: {error}\n\n"
+            "The match has been kept and will be saved the next time the app "
+            "starts. Try again now?"
+        )
+        self._save_error_shown = False
+        if retry:
+            self.repository.retry_saves()
     
     def reset(self):
         """Reset the tab"""
@@ -1,27 +1,65 @@
+import queue
+import threading
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, messagebox, simpledialog
 from typing import Dict, List
 from scripts import scripts
-from services.match_storage import MatchStorage
+from services.history_repository import HistoryRepository
+from services.username_index import UsernameIndex
+from services.fuzzy_index import FuzzyIndex
+from ui.components.loading_indicator import LoadingIndicator
 
 class SearchTab:
     """Player search tab"""
     
-    def __init__(self, parent):
+    # Wait for typing to pause before searching
+    AUTOCOMPLETE_DELAY_MS = 150
+    MAX_SUGGESTIONS = 10
+    
+    # Shorter text is too ambiguous for typo-tolerant matching
+    FUZZY_MIN_LENGTH = 4
+    
+    # How often to check whether the username indexes have been built
+    INDEX_POLL_INTERVAL_MS = 50
+    
+    def __init__(self, parent, repository: HistoryRepository):
         self.frame = ttk.Frame(parent)
-        self.all_usernames = set()
-        self.match_data: List[Dict] = []
+        self.repository = repository
+        self.stats = None
+        self.username_index = UsernameIndex()
+        self._fuzzy_index = None
+        self._index_build = 0  # bumped for every build, so stale ones are dropped
+        self._indexes_pending = 0  # indexes of the current build not yet taken
+        self._index_backlog: List[str] = []  # names added while they were building
+        self._index_results: queue.Queue = queue.Queue()
+        self._polling_indexes = False
+        self._autocomplete_job = None
+        self._suggestions = []
         
         self._build_ui()
+        
+        repository.subscribe(HistoryRepository.LOADED, self.load_data)
+        repository.subscribe(HistoryRepository.LOAD_PROGRESS, 
+                             self.loading_indicator.update_progress)
+        repository.subscribe(HistoryRepository.LOAD_FAILED, 
+                             self.loading_indicator.show_error)
+        repository.subscribe(HistoryRepository.MATCH_ADDED, self.add_game)
+        repository.subscribe(HistoryRepository.PLAYER_RENAMED, self._on_player_renamed)
     
     def _build_ui(self):
         """Build the UI"""
+        # Shown until the first load finishes
+        self.loading_indicator = LoadingIndicator(self.frame, 
+                                                  on_retry=self.repository.load_async)
+        self.loading_indicator.show(fill='x', padx=20, pady=(10, 0))
+        
         # Search input
         search_label = ttk.Label(self.frame, text="Search Player:")
         search_label.pack(pady=(20, 5))
         
         self.search_var = tk.StringVar()
         self.search_entry = ttk.Entry(self.frame, textvariable=self.search_var)
+        self.search_entry.state(["disabled"])  # Until there's something to search
         self.search_entry.pack(pady=5, padx=20, fill='x')
         
         # Autocomplete listbox
@@ -37,6 +75,9 @@ class SearchTab:
                                        text="Overall Win Rate: N/A")
         self.winrate_label.pack(pady=5)
         
+        ttk.Button(player_stats_frame, text="Rename Player...", 
+                   command=self._rename_player).pack(pady=5)
+        
         # Script filter
         self.script_filter_var = tk.StringVar()
         self.script_filter_dropdown = ttk.Combobox(
@@ -64,25 +105,138 @@ class SearchTab:
         self.role_stats_text.pack(padx=5, pady=5)
         
         # Bindings
-        self.search_entry.bind("<KeyRelease>", self._update_autocomplete)
+        self.search_entry.bind("<KeyRelease>", self._schedule_autocomplete)
         self.autocomplete_listbox.bind("<<ListboxSelect>>", self._on_select)
         self.script_filter_dropdown.bind("<<ComboboxSelected>>", 
                                         self._on_script_change)
     
     def load_data(self):
-        """Load all match data"""
-        self.match_data = MatchStorage.load_matches()
-        self.all_usernames = {m["username"] for m in self.match_data}
+        """Index the usernames in the shared stats"""
+        self.loading_indicator.hide()
+        self.stats = self.repository.stats
+        self._build_indexes()
+    
+    def _build_indexes(self):
+        """
+        Build the username and typo-tolerant indexes on a background thread,
+        as they take over a second for 100k names. Until they're done the
+        previous ones (if any) are searched; the entry opens with the first
+        """
+        self._index_build += 1
+        self._indexes_pending = 2
+        self._index_backlog = []
+        build, games_played = self._index_build, self.stats.games_played()
+        
+        def build_indexes():
+            usernames = UsernameIndex(games_played)
+            names = list(usernames.games)  # Before the main thread adds to it
+            self._index_results.put((build, usernames))
+            self._index_results.put((build, FuzzyIndex(names)))
+        
+        threading.Thread(target=build_indexes, name="username-index", daemon=True).start()
+        if not self._polling_indexes:
+            self._polling_indexes = True
+            self.frame.after(self.INDEX_POLL_INTERVAL_MS, self._poll_indexes)
+    
+    def _poll_indexes(self):
+        """Take finished indexes on the main thread, with names added since"""
+        while True:
+            try:
+                build, index = self._index_results.get_nowait()
+            except queue.Empty:
+                break
+            if build != self._index_build:
+                continue  # Superseded by a newer build
+            
+            for username in self._index_backlog:
+                index.add(username)
+            if isinstance(index, UsernameIndex):
+                self.username_index = index
+                self.search_entry.state(["!disabled"])
+            else:
+                self._fuzzy_index = index
+            self._indexes_pending -= 1
+        
+        if self._indexes_pending:
+            self.frame.after(self.INDEX_POLL_INTERVAL_MS, self._poll_indexes)
+        else:
+            self._polling_indexes = False
+            self._index_backlog = []
+    
+    def add_game(self, game: Dict):
+        """
+        Merge a just-saved game without reloading anything
+        The storage has already counted it in the stats index
+        """
+        for row in game["rows"]:
+            username = row["username"]
+            self.username_index.add(username)
+            if self._fuzzy_index is not None:
+                self._fuzzy_index.add(username)
+            if self._indexes_pending:
+                self._index_backlog.append(username)
+        
+        # Refresh the stats on screen if they belong to one of the players
+        displayed = self.search_var.get()
+        if any(row["username"] == displayed for row in game["rows"]):
+            self._display_player_stats(displayed)
+    
+    def _rename_player(self):
+        """Ask for a new name for the searched player and rename them everywhere"""
+        old_username = self.search_var.get().strip()
+        if not self.stats or not self.stats.player_stats(old_username)[1]:
+            messagebox.showerror("Unknown Player", 
+                               "Search for a player with match history first.")
+            return
+        
+        new_username = simpledialog.askstring(
+            "Rename Player", f"New name for {old_username}:", parent=self.frame
+        )
+        if not new_username or not new_username.strip():
+            return
+        
+        self.repository.rename_player(
+            old_username, new_username.strip(),
+            on_error=lambda e: messagebox.showerror("Rename Error", 
+                                                    f"Failed to rename player: {e}")
+        )
+    
+    def _on_player_renamed(self, old_username: str, new_username: str):
+        """Re-index names and follow the rename if that player is shown"""
+        self.load_data()
+        if self.search_var.get() == old_username:
+            self.search_var.set(new_username)
+            self._display_player_stats(new_username)
+    
+    def _schedule_autocomplete(self, event=None):
+        """Debounce keystrokes before updating suggestions"""
+        if self._autocomplete_job is not None:
+            self.frame.after_cancel(self._autocomplete_job)
+        self._autocomplete_job = self.frame.after(
+            self.AUTOCOMPLETE_DELAY_MS, self._update_autocomplete
+        )
     
     def _update_autocomplete(self, event=None):
         """Update autocomplete suggestions"""
-        typed = self.search_var.get().lower()
-        matches = [u for u in self.all_usernames if typed in u.lower()]
+        self._autocomplete_job = None
+        typed = self.search_var.get()
+        matches = self.username_index.search(typed, self.MAX_SUGGESTIONS)
         
-        if matches and typed:
-            self.autocomplete_listbox.delete(0, tk.END)
-            for u in matches[:10]:
-                self.autocomplete_listbox.insert(tk.END, u)
+        # Fill remaining slots with near misses so typos still find the player,
+        # once the typo-tolerant index is ready
+        if (self._fuzzy_index is not None and len(matches) < self.MAX_SUGGESTIONS 
+                and len(typed) >= self.FUZZY_MIN_LENGTH):
+            for _, username in self._fuzzy_index.search(typed):
+                if username not in matches:
+                    matches.append(username)
+            matches = matches[:self.MAX_SUGGESTIONS]
+        
+        if matches:
+            # Only touch the Listbox when the suggestions actually change
+            if matches != self._suggestions:
+                self.autocomplete_listbox.delete(0, tk.END)
+                for u in matches:
+                    self.autocomplete_listbox.insert(tk.END, u)
             self.autocomplete_listbox.place(
                 x=self.search_entry.winfo_x(), 
                 y=self.search_entry.winfo_y() + self.search_entry.winfo_height()
@@ -90,6 +244,7 @@ class SearchTab:
             self.autocomplete_listbox.lift()
         else:
             self.autocomplete_listbox.place_forget()
+        self._suggestions = matches
     
     def _on_select(self, event):
         """Handle autocomplete selection"""
@@ -116,9 +271,9 @@ class SearchTab:
     
     def _display_player_stats(self, username: str):
         """Display stats for a player"""
-        user_matches = [m for m in self.match_data if m["username"] == username]
+        wins, total = self.stats.player_stats(username)
         
-        if not user_matches:
+        if not total:
             self.winrate_label.config(
                 text=f"Overall Win Rate for {username}: N/A"
             )
@@ -129,8 +284,6 @@ class SearchTab:
             return
         
         # Overall win rate
-        wins = sum(1 for m in user_matches if m["result"] == "Win")
-        total = len(user_matches)
         rate = wins / total * 100
         self.winrate_label.config(
             text=f"Overall Win Rate for {username}: {rate:.2f}% ({wins}/{total})"
@@ -142,14 +295,12 @@ class SearchTab:
     def _update_script_stats(self, username: str):
         """Update stats for selected script"""
         selected_script = self.script_filter_var.get()
-        user_matches = [m for m in self.match_data if m["username"] == username]
         
         # Filter by script if not "All"
-        if selected_script != "All":
-            user_matches = [m for m in user_matches 
-                          if m["script"] == selected_script]
+        script = None if selected_script == "All" else selected_script
+        role_stats = self.stats.role_stats(username, script)
         
-        if not user_matches:
+        if not role_stats:
             self.script_winrate_label.config(
                 text="Win Rate for Selected Script: N/A"
             )
@@ -157,29 +308,21 @@ class SearchTab:
             return
         
         # Script win rate
-        wins = sum(1 for m in user_matches if m["result"] == "Win")
-        total = len(user_matches)
+        if script is None:
+            wins, total = self.stats.player_stats(username)
+        else:
+            wins, total = self.stats.player_script_stats(username, script)
         rate = wins / total * 100
         self.script_winrate_label.config(
             text=f"Win Rate for Selected Script: {rate:.2f}% ({wins}/{total})"
         )
         
-        # Per-role stats
-        role_stats = {}
-        for m in user_matches:
-            role = m["role"]
-            if role not in role_stats:
-                role_stats[role] = {"wins": 0, "total": 0}
-            role_stats[role]["total"] += 1
-            if m["result"] == "Win":
-                role_stats[role]["wins"] += 1
-        
         # Format role stats
         lines = []
-        for role, stats in sorted(role_stats.items()):
-            role_winrate = (stats["wins"] / stats["total"]) * 100
+        for role, (role_wins, role_total) in sorted(role_stats.items()):
+            role_winrate = (role_wins / role_total) * 100
             lines.append(
-                f"{role}: {role_winrate:.2f}% ({stats['wins']}/{stats['total']})"
+                f"{role}: {role_winrate:.2f}% ({role_wins}/{role_total})"
             )
         
         self._update_role_stats_text("\n".join(lines))
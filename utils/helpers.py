@@ -1,3 +1,7 @@
+import os
+import sys
+from config.constants import APP_DATA_NAME
+
 def is_team_winner(player_class: str, winning_team: str) -> bool:
     """
     Check if a player's class is on the winning team
@@ -13,4 +17,19 @@ def is_team_winner(player_class: str, winning_team: str) -> bool:
         return player_class in ["Townsfolk", "Outsider"]
     elif winning_team == "Demon":
         return player_class in ["Demon", "Minion"]
-    return False
\ No newline at end of file
+    return False
+def local_data_dir(*parts: str) -> str:
+    """
+    Directory for data that stays on this machine and user, created if needed
+    %LOCALAPPDATA% on Windows, ~/Library/Application Support on macOS and
+    $XDG_STATE_HOME (~/.local/state) elsewhere, then APP_DATA_NAME and parts
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_STATE_HOME") or os.path.expanduser("~/.local/state")
+    path = os.path.join(base, APP_DATA_NAME, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
\ No newline at end of file